@@ -5,13 +5,22 @@ import os # Interaction with the operation system
 import copy # Copy objects without sideeffects (actual copying instead
 			# of references)
 import datetime
-import time # two time packages are necessary to get the current POSIX
-			# time. (Used as a session key)
-import netCDF4 # Handling of the NetCDF files.
-## Package handling the access of the servers of the ECMWF
-from ecmwfapi import ECMWFDataServer
+import struct # Decoding the binary header of NetCDF3 files.
+import shutil
+import subprocess
+import tempfile # Isolated working directories of the individual sessions.
+import hashlib # Checksums of the downloaded chunks.
+import json # Caching the results of the chunk verification.
+import threading # Sharing several ECMWF accounts among downloads.
+import functools # Parametrizing the predefined reducers.
+import abc # Interface of the retrieval backends.
+## Distributing the merging of the chunk files among several processes.
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+## The heavy dependencies `numpy`, `netCDF4`, and `ecmwfapi` (or
+## `cdsapi`) are imported within the functions using them. This way
+## planning a request does not require them to be loaded.
 
-def download_queries( server, options_list ):
+def download_queries( server, options_list, workers = None ):
 	'''This function performs the actual download of the data set.
 
 	It is intended to work with a list of requests. If the user wants
@@ -24,10 +33,16 @@ def download_queries( server, options_list ):
 	server : ecmwfapi.api.ECMWFDataServer
 	    An instance created using :class:`ecmwfapi.ECMWFDataServer`. 
 		It will be used to communicate with the MARS server of the
-		ECMWF and to retrieve the data. 
+		ECMWF and to retrieve the data. Alternatively, a
+		:class:`ECMWFServerPool` spreading the requests among several
+		accounts can be supplied.
 	options_list : list
 	    A list of dictionaries. Each of the specifies the data set and
 	    the target file of a valid ECMWF retrieve.
+	workers : int, optional
+	    Number of requests submitted at the same time. If *None*, the
+	    *capacity* of `server` will be used in case it is a
+	    :class:`ECMWFServerPool` and 1 otherwise. Default = None.
 
 	Returns
 	-------
@@ -39,11 +54,403 @@ def download_queries( server, options_list ):
 	retrieve : Function handling the whole request.
 	ecmwfapi.ECMWFDataServer.retrieve
 	'''
-	for ooptions in options_list:
-		server.retrieve( ooptions )
+	if workers is None:
+		workers = getattr( server, 'capacity', 1 )
+
+	if workers > 1 and len( options_list ) > 1:
+		with ThreadPoolExecutor( max_workers = workers ) as executor:
+			futures = [ executor.submit( server.retrieve, ooptions )
+						for ooptions in options_list ]
+			for ffuture in futures:
+				ffuture.result()
+	else:
+		for ooptions in options_list:
+			server.retrieve( ooptions )
 
 	return 0
-	
+
+class ECMWFServerPool( object ):
+	'''Spreads requests among several accounts at the ECMWF.
+
+	Each account has its own queue and limit of active requests at
+	the servers of the ECMWF. By using several of them at once the
+	throughput of the download scales with the number of accounts.
+
+	A request is always submitted to the account with the lowest
+	fraction of occupied slots. If none is available, the call blocks
+	until another request finishes. In case an account throws an
+	error concerning the account itself (see
+	:meth:`is_account_error`), the request will be submitted to the
+	next one. After `max_failures` consecutive errors of this kind an
+	account will not be used anymore. All other errors, e.g. caused
+	by an invalid *param* key, are specific to the request and are
+	raised right away without affecting the account.
+
+	Parameters
+	----------
+	credentials : list, optional
+	    A list of dictionaries containing the *url*, *key*, and
+	    *email* of an account (the content of the *~/.ecmwfapirc*
+	    file) or paths to files of this format. An additional
+	    *max_active* key overwrites the limit of concurrent requests
+	    of the corresponding account. Default = None.
+	servers : list, optional
+	    Objects providing a *retrieve* method, e.g. instances of
+	    :class:`RetrievalBackend` or
+	    :class:`ecmwfapi.ECMWFDataServer`, used instead of
+	    `credentials`. Default = None.
+	max_active : int, optional
+	    Maximum number of concurrent requests per account. Default = 3.
+	max_failures : int, optional
+	    Number of consecutive errors after which an account is
+	    disabled. Default = 3.
+
+	Raises
+	------
+	ValueError
+	    If neither `credentials` nor `servers` are provided.
+
+	See Also
+	--------
+	download_queries : Submits several requests concurrently.
+	retrieve : Function handling the whole request.
+	'''
+	def __init__( self, credentials = None, servers = None, max_active = 3,
+				  max_failures = 3 ):
+		self.accounts = []
+		if servers is not None:
+			for sserver in servers:
+				self.accounts.append( { 'server' : sserver,
+										'limit' : max_active } )
+		if credentials is not None:
+			for ccredential in credentials:
+				if type( ccredential ) is str:
+					with open( os.path.expanduser( ccredential ),
+							   'r' ) as handle:
+						ccredential = json.load( handle )
+				self.accounts.append( {
+					'server' : ECMWFAPIBackend(
+						url = ccredential.get( 'url' ),
+						key = ccredential.get( 'key' ),
+						email = ccredential.get( 'email' ) ),
+					'limit' : ccredential.get( 'max_active', max_active ) } )
+		if len( self.accounts ) == 0:
+			raise ValueError(
+				'Either "credentials" or "servers" have to be provided.' )
+		for aaccount in self.accounts:
+			aaccount[ 'active' ] = 0
+			aaccount[ 'failures' ] = 0
+		self.max_failures = max_failures
+		self.condition = threading.Condition()
+
+	@property
+	def capacity( self ):
+		'''Total number of concurrent requests of all available
+		accounts.'''
+		return sum( aa[ 'limit' ] for aa in self.accounts
+					if aa[ 'failures' ] < self.max_failures )
+
+	## Fragments of the messages of errors concerning the account
+	## rather than the request (authentication, quota, connection).
+	ACCOUNT_ERROR_MESSAGES = ( 'unauthorized', 'authentication',
+							   'forbidden', 'invalid key', 'api key',
+							   'quota', 'too many', 'suspended',
+							   'connection', 'timed out', 'timeout',
+							   'service unavailable', '401', '403',
+							   '429', '503' )
+
+	def is_account_error( self, error ):
+		'''Decides whether an error was caused by the account or the
+		connection to the servers of the ECMWF rather than the
+		request itself.
+
+		Parameters
+		----------
+		error : Exception
+		    Error thrown by the *retrieve* method of an account.
+
+		Returns
+		-------
+		bool
+		    *True*, if the request might succeed using another
+		    account.
+		'''
+		if isinstance( error, ( ConnectionError, TimeoutError ) ):
+			return True
+		## The exceptions of the `requests` and `urllib` packages
+		## used by the clients are identified by their names in order
+		## to not import them.
+		for ccls in type( error ).__mro__:
+			if ccls.__name__ in ( 'URLError', 'ConnectionError',
+								  'Timeout' ):
+				return True
+		message = str( error ).lower()
+		return any( mmessage in message for mmessage in
+					self.ACCOUNT_ERROR_MESSAGES )
+
+	def retrieve( self, options ):
+		'''Submits a request to the least loaded account.
+
+		Parameters
+		----------
+		options : dict
+		    A valid request to the MARS API of the ECMWF.
+
+		Returns
+		-------
+		int
+		    Returns 0 if the request was successful.
+
+		Raises
+		------
+		RuntimeError
+		    If no account is available anymore.
+		Exception
+		    Errors specific to the request are passed on without
+		    trying other accounts.
+		'''
+		tried = []
+		last_error = None
+		while True:
+			with self.condition:
+				while True:
+					candidates = [
+						aa for aa in self.accounts if aa not in tried and
+						aa[ 'failures' ] < self.max_failures ]
+					if len( candidates ) == 0:
+						if last_error is not None:
+							raise last_error
+						raise RuntimeError( 'No ECMWF account available.' )
+					available = [ aa for aa in candidates
+								  if aa[ 'active' ] < aa[ 'limit' ] ]
+					if len( available ) > 0:
+						break
+					self.condition.wait()
+				account = min( available, key = lambda aa :
+							   aa[ 'active' ]/aa[ 'limit' ] )
+				account[ 'active' ] += 1
+
+			try:
+				account[ 'server' ].retrieve( options )
+			except Exception as error:
+				print( "\nRequest " + str( options.get( 'target' ) ) +
+					   " failed: " + str( error ) + "\n" )
+				account_error = self.is_account_error( error )
+				with self.condition:
+					account[ 'active' ] -= 1
+					if account_error:
+						account[ 'failures' ] += 1
+					self.condition.notify_all()
+				if not account_error:
+					raise
+				tried.append( account )
+				last_error = error
+			else:
+				with self.condition:
+					account[ 'active' ] -= 1
+					account[ 'failures' ] = 0
+					self.condition.notify_all()
+				return 0
+
+class RetrievalBackend( abc.ABC ):
+	'''Interface of all backends retrieving a single request.
+
+	A backend has to provide a *retrieve* method, which takes a
+	dictionary specifying a request and stores the resulting data in
+	the file specified by its *target* key. This is the same
+	interface as the one of :class:`ecmwfapi.ECMWFDataServer`.
+
+	Backends should import their dependencies not before they are
+	actually used. Subclasses not implementing *retrieve* can not be
+	instantiated.
+
+	See Also
+	--------
+	ECMWFAPIBackend : Retrieval via the **ecmwfapi** package.
+	CDSAPIBackend : Retrieval via the **cdsapi** package.
+	LocalDirectoryBackend : Replay of previously stored requests.
+	get_backend : Creates a backend by its name.
+	'''
+	@abc.abstractmethod
+	def retrieve( self, options ):
+		'''Retrieves the request `options` into the file
+		*options['target']*.
+
+		Returns
+		-------
+		int
+		    Returns 0 if the request was successful.
+		'''
+
+class ECMWFAPIBackend( RetrievalBackend ):
+	'''Retrieves requests from the MARS server of the ECMWF using the
+	**ecmwfapi** package.
+
+	The :class:`ecmwfapi.ECMWFDataServer` object is created on the
+	first call of :meth:`retrieve`.
+
+	Parameters
+	----------
+	url : str, optional
+	    URL of the API. Default = None.
+	key : str, optional
+	    Key of the account. Default = None.
+	email : str, optional
+	    Email address of the account. Default = None.
+
+	Notes
+	-----
+	If all parameters are *None*, the account specified in the
+	*~/.ecmwfapirc* file will be used.
+	'''
+	def __init__( self, url = None, key = None, email = None ):
+		self.url = url
+		self.key = key
+		self.email = email
+		self.server = None
+		self.lock = threading.Lock()
+
+	def retrieve( self, options ):
+		with self.lock:
+			if self.server is None:
+				## Package handling the access of the servers of the
+				## ECMWF
+				from ecmwfapi import ECMWFDataServer
+				self.server = ECMWFDataServer( url = self.url, key = self.key,
+											   email = self.email )
+		self.server.retrieve( options )
+		return 0
+
+class CDSAPIBackend( RetrievalBackend ):
+	'''Retrieves requests from the Climate Data Store (CDS) of the
+	Copernicus Climate Change Service using the **cdsapi** package.
+
+	The CDS expects the name of the data set as separate
+	argument. The remaining keys of a request (except of the *target*)
+	are passed on as they are.
+
+	Parameters
+	----------
+	dataset : str, optional
+	    Name of the data set in the CDS,
+	    e.g. *reanalysis-era5-complete*. If *None*, the value of the
+	    *dataset* key of each request will be used. Default = None.
+	url : str, optional
+	    URL of the API. Default = None.
+	key : str, optional
+	    Key of the account. Default = None.
+
+	Notes
+	-----
+	If `url` and `key` are *None*, the account specified in the
+	*~/.cdsapirc* file will be used.
+	'''
+	def __init__( self, dataset = None, url = None, key = None ):
+		self.dataset = dataset
+		self.url = url
+		self.key = key
+		self.client = None
+		self.lock = threading.Lock()
+
+	def retrieve( self, options ):
+		with self.lock:
+			if self.client is None:
+				import cdsapi
+				self.client = cdsapi.Client( url = self.url, key = self.key )
+		request = dict( options )
+		target = request.pop( 'target' )
+		if self.dataset is not None:
+			dataset = self.dataset
+		else:
+			dataset = request.pop( 'dataset' )
+		self.client.retrieve( dataset, request, target )
+		return 0
+
+class LocalDirectoryBackend( RetrievalBackend ):
+	'''Replays requests using files stored in a local directory.
+
+	Each request is identified by a hash of all its keys except of
+	the *target*. If a file corresponding to the request is present
+	in `directory`, it will be copied to the target. Otherwise, the
+	request will be passed on to the `source` backend and its result
+	will be stored in `directory` for later use.
+
+	This way requests can be replayed offline, e.g. for testing.
+
+	Parameters
+	----------
+	directory : str
+	    Folder containing the stored files.
+	source : RetrievalBackend, optional
+	    Backend used to retrieve requests not yet present in
+	    `directory`. Default = None.
+
+	Raises
+	------
+	IOError
+	    If a request is neither present in `directory` nor a `source`
+	    was provided.
+	'''
+	def __init__( self, directory, source = None ):
+		self.directory = directory
+		self.source = source
+
+	def file_name( self, options ):
+		'''Path of the file storing the result of the request
+		`options`.'''
+		request = dict( options )
+		request.pop( 'target', None )
+		key = hashlib.sha1( json.dumps(
+			request, sort_keys = True, default = str ).encode(
+				'utf-8' ) ).hexdigest()
+		return os.path.join( self.directory, key + '.nc' )
+
+	def retrieve( self, options ):
+		file_name = self.file_name( options )
+		if os.path.isfile( file_name ):
+			shutil.copyfile( file_name, options.get( 'target' ) )
+			return 0
+		if self.source is None:
+			raise IOError( 'The request for ' + str( options.get( 'date' ) ) +
+						   ' is not present in "' + str( self.directory ) +
+						   '".' )
+		self.source.retrieve( options )
+		os.makedirs( self.directory, exist_ok = True )
+		shutil.copyfile( options.get( 'target' ), file_name )
+		return 0
+
+## All backends, which can be selected via their name in
+## :func:`get_backend` and :func:`retrieve`.
+BACKENDS = { 'ecmwfapi' : ECMWFAPIBackend, 'cds' : CDSAPIBackend,
+			 'local' : LocalDirectoryBackend }
+
+def get_backend( name, **kwargs ):
+	'''Creates a backend using its name.
+
+	Parameters
+	----------
+	name : str
+	    Key of the backend in the module-level dictionary *BACKENDS*.
+	    Available are *ecmwfapi*, *cds*, and *local*.
+	**kwargs
+	    Arguments passed to the constructor of the backend.
+
+	Returns
+	-------
+	RetrievalBackend
+	    An instance of the selected backend.
+
+	Raises
+	------
+	ValueError
+	    If there is no backend of the name `name`.
+	'''
+	if name not in BACKENDS:
+		raise ValueError( 'Unknown backend "' + str( name ) +
+						  '". Available are: ' +
+						  ", ".join( sorted( BACKENDS.keys() ) ) )
+	return BACKENDS[ name ]( **kwargs )
+
 def erainterim_default_options():
 	'''Returns a dictionary of the default options for the ERA-Interim
 	data set.
@@ -342,7 +749,42 @@ def split_query_into_list_of_queries( options ):
 		
 	return options_list
 
-def combine_netcdf_files( output_name, session_key = None, delete = True ):
+def partial_file_name( output_name ):
+	'''Creates a unique, empty file next to `output_name` to write the
+	output into.
+
+	Once the output is complete, it will be renamed to `output_name`
+	using :func:`os.replace`. Since both files reside in the same
+	folder, the renaming is atomic and other processes never see an
+	incomplete output. In contrast to :func:`tempfile.mkstemp`, the
+	permissions of the file follow the umask of the process, so other
+	users can read the output as usual.
+
+	Parameters
+	----------
+	output_name : str
+	    Name of the final output.
+
+	Returns
+	-------
+	str
+	    Path of the partial file.
+	'''
+	directory = os.path.dirname( os.path.abspath( output_name ) )
+	while True:
+		file_name = os.path.join(
+			directory, '.' + os.path.basename( output_name ) + '.' +
+			os.urandom( 4 ).hex() + '.part' )
+		try:
+			handle = os.open( file_name,
+							  os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666 )
+		except FileExistsError:
+			continue
+		os.close( handle )
+		return file_name
+
+def combine_netcdf_files( output_name, session_key = None, delete = True,
+						  workers = 1, files = None ):
 	'''Combines all NetCDF files downloaded during one MARS session (a
 	single request split into the individual years) into a single file.
 
@@ -351,6 +793,9 @@ def combine_netcdf_files( output_name, session_key = None, delete = True ):
 	make sure the program is properly installed on your system.
 	http://nco.sf.net/
 
+	The output is written to a partial file first, which is renamed
+	to `output_name` once it is complete.
+
 	Parameters
 	----------
 	output_name : str
@@ -360,17 +805,31 @@ def combine_netcdf_files( output_name, session_key = None, delete = True ):
 	session_key : int, optional
 	   String specifying the individual session. It is generated using
 	   the current time and date. If *None*, all NetCDF files in the
-	   current directory will be joined. Default = None.
+	   current directory will be joined. Ignored if `files` is
+	   provided. Default = None.
 	delete : bool, optional
 	   Logical value specifying whether or not to delete the
 	   downloaded chunk NetCDF files joined by this function. Default
 	   = True. 
+	workers : int, optional
+	   Number of processes used to merge the chunks. If larger than
+	   1, :func:`combine_netcdf_files_parallel` will be used instead
+	   of a single *ncrcat* call. Default = 1.
+	files : list, optional
+	   Paths of the chunks to combine in temporal order. If *None*,
+	   the current directory will be scanned for chunks using
+	   `session_key`. Default = None.
 
 	Returns
 	-------
 	int
 	   Returns 0 if everything worked out and no error was thrown.
 
+	Raises
+	------
+	IOError
+	   If *ncrcat* fails.
+
 	Notes
 	-----
 	This function assumes all the netCDF files, which should be
@@ -382,22 +841,40 @@ def combine_netcdf_files( output_name, session_key = None, delete = True ):
 	--------
 	retrieve : Function handling the whole request.
 	'''
-	## Get all NetCDF files present in the current directory.
-	files_present = os.listdir()
-	files_netcdf = [] # This list will contain all netCDF file names.
-	for ffile in files_present:
-		if ffile.find( '.nc' ) > -1:
-			## The file has an .nc extension
-			if session_key is None or \
-				ffile.find( str( session_key ) ) > -1:
-				## The session_key is valid
-				files_netcdf.append( ffile )
-
-	## Use the command line program `ncrcat` to join the NetCDF files.
-	## It is provided by the NCO toolkit http://nco.sourceforge.net/
+	if files is not None:
+		files_netcdf = list( files )
+	else:
+		## Get all NetCDF files present in the current directory.
+		files_present = os.listdir()
+		files_netcdf = [] # This list will contain all netCDF file names.
+		for ffile in files_present:
+			if ffile.find( '.nc' ) > -1:
+				## The file has an .nc extension
+				if session_key is None or \
+					ffile.find( str( session_key ) ) > -1:
+					## The session_key is valid
+					files_netcdf.append( ffile )
+		files_netcdf = sorted( files_netcdf )
+
 	print( "\nCombining the chunk requests into one NetCDF file...\n" )
-	os.system( "ncrcat " + " ".join( sorted( files_netcdf ) ) + \
-			   " -o " + str( output_name ) )
+	output_partial = partial_file_name( output_name )
+	try:
+		if workers is not None and workers > 1:
+			combine_netcdf_files_parallel( output_partial, files_netcdf,
+										   workers = workers )
+		else:
+			## Use the command line program `ncrcat` to join the NetCDF
+			## files. It is provided by the NCO toolkit
+			## http://nco.sourceforge.net/
+			status = subprocess.call( [ "ncrcat" ] + files_netcdf +
+									  [ "-O", "-o", output_partial ] )
+			if status != 0:
+				raise IOError( 'ncrcat failed to combine the chunks.' )
+		os.replace( output_partial, output_name )
+	except BaseException:
+		if os.path.isfile( output_partial ):
+			os.remove( output_partial )
+		raise
 
 	if delete:
 		## Delete all the retrieved files containing chunks of full
@@ -408,7 +885,1265 @@ def combine_netcdf_files( output_name, session_key = None, delete = True ):
 			
 	return 0
 
-def retrieve( options = None, delete = True ):
+def read_netcdf_record_layout( file_names ):
+	'''Checks whether several NetCDF3 files differ only in their
+	number of records.
+
+	This is the case for the chunks of a single request as long as
+	the MARS server did not pack them using different
+	*scale_factor* and *add_offset* attributes. Their records can then
+	be joined by simply concatenating the corresponding bytes.
+
+	Parameters
+	----------
+	file_names : list
+	    Paths to the NetCDF files in the order they should be joined.
+
+	Returns
+	-------
+	list or None
+	    A list containing the output of :func:`read_netcdf_header` for
+	    each file or *None*, if at least one of the files is not in
+	    the NetCDF3 format, has no record variables, or their headers
+	    do not match.
+
+	See Also
+	--------
+	combine_netcdf_files_parallel : Makes use of this function.
+	'''
+	headers = []
+	header_bytes = None
+	for ffile in file_names:
+		try:
+			header = read_netcdf_header( ffile )
+		except ( ValueError, KeyError, UnicodeDecodeError ):
+			return None
+		if header[ 'record_size' ] == 0:
+			return None
+		with open( ffile, 'rb' ) as handle:
+			raw = handle.read( header[ 'header_size' ] )
+		## Except for the number of records (bytes 4 to 8) all headers
+		## have to be identical.
+		raw = raw[ 0 : 4 ] + raw[ 8 : ]
+		if header_bytes is None:
+			header_bytes = raw
+		elif raw != header_bytes:
+			return None
+		headers.append( header )
+	return headers
+
+def copy_netcdf_records( input_name, output_name, input_offset, size,
+						 output_offset, block_size = 2**24 ):
+	'''Copies `size` bytes starting at `input_offset` in `input_name`
+	to the position `output_offset` in the already existing file
+	`output_name`.
+
+	This is the task performed by each worker in
+	:func:`combine_netcdf_files_parallel`. Since all workers write
+	disjoint ranges of the output file, no locking is necessary.
+
+	Returns
+	-------
+	int
+	   Returns 0 if everything worked out and no error was thrown.
+	'''
+	with open( input_name, 'rb' ) as input_handle, \
+		 open( output_name, 'r+b' ) as output_handle:
+		input_handle.seek( input_offset )
+		output_handle.seek( output_offset )
+		while size > 0:
+			block = input_handle.read( min( block_size, size ) )
+			if len( block ) == 0:
+				raise IOError( 'Unexpected end of file in "' +
+							   str( input_name ) + '".' )
+			output_handle.write( block )
+			size -= len( block )
+	return 0
+
+def concatenate_netcdf_files( file_names, output_name ):
+	'''Joins a list of NetCDF files using *ncrcat*.
+
+	This is the fallback of :func:`combine_netcdf_files_parallel` in
+	case the records of the files can not be copied directly.
+
+	Returns
+	-------
+	int
+	   Returns 0 if everything worked out and no error was thrown.
+	'''
+	status = subprocess.call( [ "ncrcat" ] + list( file_names ) +
+							  [ "-O", "-o", output_name ] )
+	if status != 0:
+		raise IOError( 'ncrcat failed to join ' + ", ".join( file_names ) )
+	return 0
+
+def combine_netcdf_files_parallel( output_name, file_names, workers = None ):
+	'''Joins a list of NetCDF files using a pool of processes.
+
+	If all files are in the NetCDF3 format and their headers differ
+	only in the number of records, the offset of each chunk within
+	the output is calculated up front from its number of records. The
+	output file is allocated in full and the workers copy the records
+	of the individual chunks into their disjoint ranges at the same
+	time.
+
+	Otherwise (e.g. the MARS server packed the chunks using different
+	*scale_factor* and *add_offset* attributes) the files are joined
+	by a single call of *ncrcat* just like in
+	:func:`combine_netcdf_files`.
+
+	Parameters
+	----------
+	output_name : str
+	    Name of the combined netCDF file.
+	file_names : list
+	    Paths to the NetCDF files in the order they should be joined
+	    (along the record dimension).
+	workers : int, optional
+	    Number of worker processes. If *None*, the number of CPUs of
+	    the system will be used. Default = None.
+
+	Returns
+	-------
+	int
+	   Returns 0 if everything worked out and no error was thrown.
+
+	See Also
+	--------
+	combine_netcdf_files : Serial version of this function.
+	'''
+	if len( file_names ) == 0:
+		raise ValueError( 'No NetCDF files to combine.' )
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	headers = read_netcdf_record_layout( file_names )
+	if headers is not None and \
+	   sum( hh[ 'numrecs' ] for hh in headers ) < 0xFFFFFFFF:
+		header = headers[ 0 ]
+		record_size = header[ 'record_size' ]
+		record_start = header[ 'record_start' ]
+		numrecs_total = sum( hh[ 'numrecs' ] for hh in headers )
+
+		## Write the header and the non-record variables (e.g. the
+		## longitude and latitude) of the first chunk and allocate
+		## the remaining file.
+		with open( file_names[ 0 ], 'rb' ) as input_handle:
+			prefix = bytearray( input_handle.read( record_start ) )
+		prefix[ 4 : 8 ] = struct.pack( '>I', numrecs_total )
+		with open( output_name, 'wb' ) as output_handle:
+			output_handle.write( prefix )
+			output_handle.truncate( record_start +
+									numrecs_total*record_size )
+
+		## Offset of the individual chunks within the output.
+		tasks = []
+		offset = record_start
+		for ffile, hheader in zip( file_names, headers ):
+			size = hheader[ 'numrecs' ]*record_size
+			tasks.append( ( ffile, size, offset ) )
+			offset += size
+		with ProcessPoolExecutor( max_workers = workers ) as executor:
+			futures = [ executor.submit( copy_netcdf_records, ffile,
+										 output_name, record_start, size,
+										 ooffset )
+						for ffile, size, ooffset in tasks ]
+			for ffuture in futures:
+				ffuture.result()
+		return 0
+
+	## Chunks packed differently have to be unpacked and packed
+	## again. Merging them pairwise in a tree would rewrite each
+	## record several times and the final merge alone would already
+	## be as expensive as a single call of *ncrcat*.
+	return concatenate_netcdf_files( file_names, output_name )
+
+## The MARS server renames parameters starting with a digit when
+## converting them into the NetCDF format.
+NETCDF_PARAMETER_NAMES = { '2t' : 't2m', '2d' : 'd2m', '10u' : 'u10',
+						   '10v' : 'v10', '100u' : 'u100', '100v' : 'v100',
+						   '10fg' : 'fg10', '10si' : 'si10' }
+
+def parse_date_range( date_string ):
+	'''Extracts the first and the last day of the *date* key of a
+	request.
+
+	Parameters
+	----------
+	date_string : str
+	    A string of the format *1999-01-01* or
+	    *1999-01-01/to/2000-01-01*.
+
+	Returns
+	-------
+	tuple
+	    Two :class:`datetime.date` objects marking the beginning and
+	    the end of the temporal range.
+
+	Raises
+	------
+	SyntaxError
+	    If `date_string` is not of the expected format.
+	'''
+	if type( date_string ) is list and len( date_string ) == 1:
+		## Single dates are returned as a list by
+		## :func:`split_date_into_list_of_years`.
+		date_string = date_string[ 0 ]
+	if type( date_string ) is not str:
+		raise SyntaxError( 'Unexpected input format.' )
+	date_string_split = date_string.split( "/" )
+	if len( date_string_split ) not in ( 1, 3 ):
+		raise SyntaxError( 'Unexpected input format.' )
+	try:
+		return ( datetime.datetime.strptime(
+			date_string_split[ 0 ], '%Y-%m-%d' ).date(),
+				 datetime.datetime.strptime(
+			date_string_split[ -1 ], '%Y-%m-%d' ).date() )
+	except ValueError:
+		raise SyntaxError( 'Unexpected input format.' )
+
+def verify_netcdf_file( file_name, options = None, checksum = None ):
+	'''Checks whether a downloaded chunk is complete and matches its
+	request.
+
+	The following checks are performed:
+
+	- The file has a valid header and, in case of a NetCDF3 file, is
+	  large enough to hold all the variables specified in it.
+	- All parameters in the *param* key of `options` are present as
+	  variables. Parameters specified via their numerical code are
+	  not checked.
+	- The file contains a non-empty *time* dimension and, if a
+	  *grid* was requested, *latitude* and *longitude* dimensions.
+	- The time coordinate lies within the range of the *date* key of
+	  `options` (extended by the largest *step* for forecasts).
+	- Optionally, the SHA-256 checksum of the file matches
+	  `checksum`.
+
+	Parameters
+	----------
+	file_name : str
+	    Path to the downloaded chunk.
+	options : dict, optional
+	    Request used to download the chunk. If *None*, only the
+	    integrity of the file is checked. Default = None.
+	checksum : str, optional
+	    Expected SHA-256 checksum of the file as hexadecimal
+	    string. Default = None.
+
+	Returns
+	-------
+	str or None
+	    A description of the first problem encountered or *None*, if
+	    the file passed all checks.
+
+	See Also
+	--------
+	verify_netcdf_files : Verifies several chunks in parallel.
+	'''
+	import numpy
+	import netCDF4
+	if not os.path.isfile( file_name ):
+		return 'File does not exist.'
+	file_size = os.path.getsize( file_name )
+	if file_size == 0:
+		return 'File is empty.'
+
+	## Files in the NetCDF3 format do not contain any checksums. So
+	## they have to be checked for truncation by hand.
+	with open( file_name, 'rb' ) as handle:
+		magic = handle.read( 3 )
+	if magic == b'CDF':
+		try:
+			header = read_netcdf_header( file_name )
+		except Exception as error:
+			## A corrupted chunk must not abort the whole request but
+			## be downloaded again.
+			return 'Invalid header: ' + str( error )
+		expected_size = header[ 'record_start' ] + \
+			header[ 'numrecs' ]*header[ 'record_size' ]
+		for vvariable in header[ 'variables' ].values():
+			if not vvariable[ 'record' ]:
+				expected_size = max( expected_size, vvariable[ 'begin' ] +
+									 vvariable[ 'vsize' ] )
+		if file_size < expected_size:
+			return 'File is truncated (' + str( file_size ) + ' of ' + \
+				str( expected_size ) + ' bytes).'
+
+	try:
+		handle = netCDF4.Dataset( file_name )
+	except Exception as error:
+		return 'Invalid header: ' + str( error )
+	with handle:
+		if options is not None:
+			## Expected variables
+			for pparam in str( options.get( 'param', '' ) ).split( "/" ):
+				pparam = pparam.strip().lower()
+				if pparam == '' or pparam.replace( '.', '' ).isdigit():
+					continue
+				if pparam[ 0 ].isdigit() and \
+				   pparam not in NETCDF_PARAMETER_NAMES:
+					continue
+				name = NETCDF_PARAMETER_NAMES.get( pparam, pparam )
+				if name not in handle.variables:
+					return 'Variable "' + name + '" is missing.'
+
+			## Expected dimensions
+			expected_dimensions = [ 'time' ]
+			if options.get( 'grid' ) is not None:
+				expected_dimensions += [ 'latitude', 'longitude' ]
+			for ddimension in expected_dimensions:
+				if ddimension not in handle.dimensions:
+					return 'Dimension "' + ddimension + '" is missing.'
+				if handle.dimensions[ ddimension ].size == 0:
+					return 'Dimension "' + ddimension + '" is empty.'
+
+			## Temporal range
+			if options.get( 'date' ) is not None and \
+			   'time' in handle.variables:
+				try:
+					date_start, date_end = parse_date_range(
+						options.get( 'date' ) )
+				except SyntaxError:
+					date_start = None
+				if date_start is not None:
+					time = handle.variables[ 'time' ]
+					try:
+						dates = netCDF4.num2date(
+							[ numpy.min( time[ : ] ), numpy.max( time[ : ] ) ],
+							time.units,
+							calendar = getattr( time, 'calendar',
+												'standard' ),
+							only_use_cftime_datetimes = False,
+							only_use_python_datetimes = True )
+					except ( AttributeError, ValueError ) as error:
+						return 'Invalid time coordinate: ' + str( error )
+					steps = [ 0 ]
+					for sstep in str( options.get( 'step', '0' ) ).split( "/" ):
+						if sstep.strip().isdigit():
+							steps.append( int( sstep ) )
+					range_start = datetime.datetime.combine(
+						date_start, datetime.time() )
+					range_end = datetime.datetime.combine(
+						date_end, datetime.time() ) + \
+						datetime.timedelta( days = 1, hours = max( steps ) )
+					if dates[ 0 ] < range_start or dates[ 1 ] > range_end:
+						return 'Time coordinate (' + str( dates[ 0 ] ) + \
+							' to ' + str( dates[ 1 ] ) + \
+							') does not match the requested dates.'
+
+	if checksum is not None:
+		sha256 = hashlib.sha256()
+		with open( file_name, 'rb' ) as handle:
+			for bblock in iter( lambda : handle.read( 2**24 ), b'' ):
+				sha256.update( bblock )
+		if sha256.hexdigest() != checksum.lower():
+			return 'Checksum mismatch.'
+
+	return None
+
+def verify_netcdf_files( file_names, options_list = None, workers = None,
+						 checksums = None, cache_file = None ):
+	'''Verifies several downloaded chunks concurrently.
+
+	Each file is checked using :func:`verify_netcdf_file` on a pool of
+	processes.
+
+	Parameters
+	----------
+	file_names : list
+	    Paths to the downloaded chunks.
+	options_list : list, optional
+	    Requests used to download the chunks. It has to be of the same
+	    length as `file_names`. If *None*, only the integrity of the
+	    files is checked. Default = None.
+	workers : int, optional
+	    Number of worker processes. If *None*, the number of CPUs of
+	    the system will be used. Default = None.
+	checksums : dict, optional
+	    Expected SHA-256 checksums using the base names of the files
+	    as keys. Default = None.
+	cache_file : str, optional
+	    Path to a JSON file storing the results of previous
+	    verifications. A file will not be checked again as long as
+	    its path, size, modification time, request, and checksum did
+	    not change. Entries of files, which were deleted or modified
+	    in the meantime, are removed from the cache. Default = None.
+
+	Returns
+	-------
+	dict
+	    A dictionary with the file names as keys and the outputs of
+	    :func:`verify_netcdf_file` as values.
+
+	Notes
+	-----
+	The cache only pays off for files verified several times,
+	e.g. chunks kept using *delete = False*. Since :func:`retrieve`
+	downloads into a new session folder on every call, it does not
+	use a cache.
+
+	See Also
+	--------
+	redownload_invalid_queries : Downloads the chunks again, which
+	    did not pass the verification.
+	'''
+	if options_list is None:
+		options_list = [ None ]*len( file_names )
+	if len( options_list ) != len( file_names ):
+		raise ValueError(
+			'"file_names" and "options_list" have to be of the same length.' )
+	if checksums is None:
+		checksums = {}
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	cache = {}
+	if cache_file is not None and os.path.isfile( cache_file ):
+		try:
+			with open( cache_file, 'r' ) as handle:
+				cache = json.load( handle )
+		except ValueError:
+			## Corrupted cache files will be overwritten.
+			cache = {}
+
+	results = {}
+	tasks = {}
+	for ffile, ooptions in zip( file_names, options_list ):
+		checksum = checksums.get( os.path.basename( ffile ) )
+		if not os.path.isfile( ffile ):
+			results[ ffile ] = 'File does not exist.'
+			continue
+		status = os.stat( ffile )
+		## Identifies the state of the file and the checks applied to
+		## it.
+		key = [ status.st_size, status.st_mtime_ns,
+				json.dumps( ooptions, sort_keys = True, default = str ),
+				checksum ]
+		entry = cache.get( os.path.abspath( ffile ) )
+		if entry is not None and entry.get( 'key' ) == key:
+			results[ ffile ] = entry.get( 'result' )
+		else:
+			tasks[ ffile ] = ( ooptions, checksum, key )
+
+	if len( tasks ) == 1 or ( len( tasks ) > 1 and workers == 1 ):
+		## Not worth starting any processes.
+		for ffile, ttask in tasks.items():
+			results[ ffile ] = verify_netcdf_file( ffile, ttask[ 0 ],
+												   ttask[ 1 ] )
+	elif len( tasks ) > 1:
+		with ProcessPoolExecutor(
+				max_workers = min( workers, len( tasks ) ) ) as executor:
+			futures = { ffile : executor.submit( verify_netcdf_file, ffile,
+												 ttask[ 0 ], ttask[ 1 ] )
+						for ffile, ttask in tasks.items() }
+			for ffile, ffuture in futures.items():
+				results[ ffile ] = ffuture.result()
+	for ffile, ttask in tasks.items():
+		cache[ os.path.abspath( ffile ) ] = {
+			'key' : ttask[ 2 ], 'result' : results[ ffile ] }
+
+	if cache_file is not None:
+		## Prune the entries of all files, which do not exist anymore
+		## or changed since their verification.
+		cache_pruned = {}
+		for ffile, eentry in cache.items():
+			try:
+				status = os.stat( ffile )
+			except OSError:
+				continue
+			key = eentry.get( 'key' )
+			if type( key ) is list and len( key ) == 4 and \
+			   key[ 0 : 2 ] == [ status.st_size, status.st_mtime_ns ]:
+				cache_pruned[ ffile ] = eentry
+		if len( tasks ) > 0 or len( cache_pruned ) != len( cache ):
+			with open( cache_file, 'w' ) as handle:
+				json.dump( cache_pruned, handle )
+
+	return results
+
+def redownload_invalid_queries( server, options_list, retries = 2,
+								workers = None, checksums = None,
+								cache_file = None ):
+	'''Verifies the downloaded chunks and downloads the invalid ones
+	again.
+
+	Parameters
+	----------
+	server : ecmwfapi.api.ECMWFDataServer
+	    Object used to retrieve the data.
+	options_list : list
+	    A list of dictionaries specifying the requests of all chunks.
+	retries : int, optional
+	    Maximum number of times an invalid chunk will be downloaded
+	    again. Default = 2.
+	workers : int, optional
+	    Number of processes used to verify the chunks. Default = None.
+	checksums : dict, optional
+	    See :func:`verify_netcdf_files`. Default = None.
+	cache_file : str, optional
+	    See :func:`verify_netcdf_files`. Default = None.
+
+	Returns
+	-------
+	int
+	   Returns 0 if all chunks passed the verification.
+
+	Raises
+	------
+	IOError
+	    If at least one chunk is still invalid after `retries`
+	    downloads.
+
+	See Also
+	--------
+	verify_netcdf_files : Performs the verification.
+	download_queries : Downloads a list of requests.
+	'''
+	options_pending = list( options_list )
+	for aattempt in range( retries + 1 ):
+		results = verify_netcdf_files(
+			[ oo.get( 'target' ) for oo in options_pending ],
+			options_pending, workers = workers, checksums = checksums,
+			cache_file = cache_file )
+		options_pending = [ oo for oo in options_pending
+							if results[ oo.get( 'target' ) ] is not None ]
+		if len( options_pending ) == 0:
+			return 0
+		for ooptions in options_pending:
+			print( "\nChunk " + ooptions.get( 'target' ) + " is invalid: " +
+				   results[ ooptions.get( 'target' ) ] )
+		if aattempt == retries:
+			break
+		print( "\nDownloading the invalid chunks again...\n" )
+		for ooptions in options_pending:
+			if os.path.isfile( ooptions.get( 'target' ) ):
+				os.remove( ooptions.get( 'target' ) )
+		download_queries( server, options_pending )
+
+	raise IOError( 'The following chunks are still invalid after ' +
+				   str( retries ) + ' retries: ' +
+				   ", ".join( oo.get( 'target' ) for oo in options_pending ) )
+
+def estimate_chunk_size( options ):
+	'''Estimates the size of the NetCDF file resulting from a request.
+
+	The MARS server packs all fields into 16 bit integers. So the size
+	of the file is roughly given by the number of grid points times
+	the number of time steps and parameters times two bytes.
+
+	Parameters
+	----------
+	options : dict
+	    A request to the MARS API of the ECMWF. Its *grid*, *area*,
+	    *date*, *time*, *step*, *number*, and *param* keys are taken
+	    into account.
+
+	Returns
+	-------
+	int
+	    Estimated size of the file in bytes.
+
+	See Also
+	--------
+	retrieve : Uses this estimate to schedule the downloads within a
+	    disk budget.
+	'''
+	def split( value ):
+		## Elements of a list like "00/06/12/18" or [ 0.75, 0.75 ].
+		if type( value ) in ( list, tuple ):
+			return [ str( vv ).strip() for vv in value ]
+		return [ vv.strip() for vv in str( value ).split( "/" )
+				 if vv.strip() != '' ]
+
+	def to_number( value ):
+		## Times might be given as "06:00".
+		parts = value.split( ":" )
+		return float( parts[ 0 ] ) + sum(
+			float( pp )/60**( ii + 1 )
+			for ii, pp in enumerate( parts[ 1 : ] ) )
+
+	def count( value ):
+		## Number of elements in a list including ranges like
+		## "00/to/18/by/6" or "1/to/50".
+		elements = split( value )
+		number = 0
+		ii = 0
+		while ii < len( elements ):
+			if elements[ ii ].lower() == 'to' and 0 < ii and \
+			   ii + 1 < len( elements ):
+				increment = 1.
+				ii_next = ii + 2
+				if ii + 3 < len( elements ) and \
+				   elements[ ii + 2 ].lower() == 'by':
+					increment = elements[ ii + 3 ]
+					ii_next = ii + 4
+				try:
+					start = to_number( elements[ ii - 1 ] )
+					end = to_number( elements[ ii + 1 ] )
+					increment = abs( to_number( str( increment ) ) )
+					## The start was already counted.
+					number += int( abs( end - start )//increment )
+				except ( ValueError, ZeroDivisionError ):
+					number += 1
+				ii = ii_next
+				continue
+			number += 1
+			ii += 1
+		return max( 1, number )
+
+	grid = split( options.get( 'grid', '0.75/0.75' ) )
+	try:
+		step_longitude = float( grid[ 0 ] )
+		step_latitude = float( grid[ -1 ] )
+	except ValueError:
+		step_longitude = step_latitude = 0.75
+	area = options.get( 'area' )
+	if area is None or str( area ).upper() in ( 'G', 'GLOBE' ):
+		number_longitude = int( round( 360./step_longitude ) )
+		number_latitude = int( round( 180./step_latitude ) ) + 1
+	else:
+		north, west, south, east = [
+			float( aa ) for aa in split( area ) ]
+		number_longitude = int( round( abs( east - west )/step_longitude ) ) + 1
+		number_latitude = int( round( abs( north - south )/step_latitude ) ) + 1
+
+	try:
+		date_start, date_end = parse_date_range( options.get( 'date' ) )
+		number_days = ( date_end - date_start ).days + 1
+	except SyntaxError:
+		number_days = 366
+
+	number_fields = number_days*count( options.get( 'time', '00' ) )*\
+		count( options.get( 'step', '0' ) )*\
+		count( options.get( 'number', '0' ) )*\
+		count( options.get( 'param', '' ) )
+	## Two bytes per value plus the header and coordinates.
+	return number_fields*number_longitude*number_latitude*2 + \
+		( number_longitude + number_latitude )*8 + 2**14
+
+def append_netcdf_file( output_name, file_name ):
+	'''Appends the records of a NetCDF file to another one and deletes
+	it afterwards.
+
+	If `output_name` does not exist yet or is empty, `file_name` will
+	just be moved. If both files are in the NetCDF3 format and their headers
+	differ only in the number of records, the records of `file_name`
+	are copied to the end of `output_name` in place. Otherwise the
+	`--rec_apn` option of *ncrcat* is used.
+
+	Parameters
+	----------
+	output_name : str
+	    Name of the combined NetCDF file.
+	file_name : str
+	    Name of the chunk to append.
+
+	Returns
+	-------
+	int
+	   Returns 0 if everything worked out and no error was thrown.
+
+	See Also
+	--------
+	download_and_append_queries : Uses this function to combine the
+	    chunks as soon as they are downloaded.
+	'''
+	if not os.path.isfile( output_name ) or \
+	   os.path.getsize( output_name ) == 0:
+		shutil.move( file_name, output_name )
+		return 0
+
+	headers = read_netcdf_record_layout( [ output_name, file_name ] )
+	if headers is not None and \
+	   headers[ 0 ][ 'numrecs' ] + headers[ 1 ][ 'numrecs' ] < 0xFFFFFFFF:
+		record_size = headers[ 0 ][ 'record_size' ]
+		record_start = headers[ 0 ][ 'record_start' ]
+		numrecs = headers[ 0 ][ 'numrecs' ] + headers[ 1 ][ 'numrecs' ]
+		copy_netcdf_records( file_name, output_name, record_start,
+							 headers[ 1 ][ 'numrecs' ]*record_size,
+							 record_start +
+							 headers[ 0 ][ 'numrecs' ]*record_size )
+		## Only update the number of records after all of them are
+		## written.
+		with open( output_name, 'r+b' ) as handle:
+			handle.truncate( record_start + numrecs*record_size )
+			handle.seek( 4 )
+			handle.write( struct.pack( '>I', numrecs ) )
+	else:
+		status = subprocess.call( [ "ncrcat", "--rec_apn", file_name,
+									output_name ] )
+		if status != 0:
+			raise IOError( 'ncrcat failed to append ' + str( file_name ) +
+						   ' to ' + str( output_name ) )
+	os.remove( file_name )
+	return 0
+
+def download_and_append_queries( server, options_list, output_name,
+								 max_pending = 1, verify = True,
+								 retries = 2, reducers = None,
+								 workers = 1, checksums = None ):
+	'''Downloads a list of requests and appends each chunk to the
+	output right away.
+
+	At most `max_pending` chunks are downloaded before they are
+	appended to `output_name` and deleted. This way the peak usage of
+	the disk stays close to the size of the final output.
+
+	Parameters
+	----------
+	server : RetrievalBackend
+	    Object used to retrieve the data.
+	options_list : list
+	    A list of dictionaries specifying the requests of all chunks
+	    in temporal order.
+	output_name : str
+	    Name of the combined NetCDF file. The chunks are appended to a
+	    partial file, which replaces `output_name` once all of them
+	    are merged.
+	max_pending : int, optional
+	    Maximum number of downloaded chunks not yet appended to the
+	    output. Default = 1.
+	verify : bool, optional
+	    Whether or not to check the chunks before appending
+	    them. Default = True.
+	retries : int, optional
+	    Maximum number of times an invalid chunk will be downloaded
+	    again. Default = 2.
+	reducers : dict, optional
+	    If provided, the chunks are reduced before appending them. See
+	    :func:`reduce_netcdf_file`. Default = None.
+	workers : int, optional
+	    Number of processes reducing the chunks. Default = 1.
+	checksums : dict, optional
+	    See :func:`verify_netcdf_files`. Default = None.
+
+	Returns
+	-------
+	int
+	   Returns 0 if everything worked out and no error was thrown.
+
+	See Also
+	--------
+	retrieve : Function handling the whole request.
+	append_netcdf_file : Appends a single chunk.
+	'''
+	max_pending = max( 1, max_pending )
+	output_partial = partial_file_name( output_name )
+	time_last = None
+	try:
+		for ll in range( 0, len( options_list ), max_pending ):
+			options_pending = options_list[ ll : ll + max_pending ]
+			download_queries( server, options_pending,
+							  workers = min( max_pending, getattr(
+								  server, 'capacity', 1 ) ) )
+			if verify:
+				redownload_invalid_queries( server, options_pending,
+											retries = retries,
+											checksums = checksums )
+			file_names = [ oo.get( 'target' ) for oo in options_pending ]
+			if reducers is not None:
+				file_names = reduce_netcdf_files( file_names, reducers,
+												  workers = workers )
+				time_last = check_order_of_reduced_files( file_names,
+														  time_last )
+			for ffile in file_names:
+				append_netcdf_file( output_partial, ffile )
+		os.replace( output_partial, output_name )
+	except BaseException:
+		if os.path.isfile( output_partial ):
+			os.remove( output_partial )
+		raise
+	return 0
+
+## Periods supported by :func:`aggregate_time`. All of them are
+## aligned with the calendar months.
+AGGREGATION_PERIODS = { 'M' : 'month', 'D' : 'day', 'h' : 'hour',
+						'm' : 'minute', 's' : 'second' }
+
+def aggregate_time( data, times, attributes, period = 'D',
+					method = 'mean' ):
+	'''Aggregates a field over consecutive periods of time.
+
+	This function is the basis of the predefined reducers like
+	*daily_mean* or *monthly_max*. Missing values (*NaN*) are ignored.
+
+	Parameters
+	----------
+	data : numpy.ndarray
+	    Values of a variable with time as its first dimension.
+	times : numpy.ndarray
+	    Sorted time coordinate of type *datetime64*.
+	attributes : dict
+	    Attributes of the variable.
+	period : str, optional
+	    Unit of a :class:`numpy.datetime64` specifying the length of
+	    the period. One of *M* (months), *D* (days), *h* (hours), *m*
+	    (minutes), or *s* (seconds). Default = 'D'.
+	method : str, optional
+	    One of *mean*, *sum*, *max*, or *min*. Default = 'mean'.
+
+	Returns
+	-------
+	tuple
+	    The aggregated `data`, the beginnings of the periods, and the
+	    updated `attributes`.
+
+	Raises
+	------
+	ValueError
+	    If `method` or `period` is not supported.
+
+	Notes
+	-----
+	Weeks (*W*) are not supported since they start on Thursdays in
+	:mod:`numpy` and thus straddle the month boundaries at which
+	:func:`reduce_netcdf_file` splits the chunks.
+
+	See Also
+	--------
+	reduce_netcdf_file : Applies the reducers to a chunk.
+	'''
+	import numpy
+	if method not in ( 'mean', 'sum', 'max', 'min' ):
+		raise ValueError( 'Unknown aggregation method "' + str( method ) +
+						  '".' )
+	if period not in AGGREGATION_PERIODS:
+		raise ValueError( 'Unsupported aggregation period "' +
+						  str( period ) + '".' )
+	attributes = dict( attributes )
+	attributes[ 'cell_methods' ] = 'time: ' + \
+		{ 'mean' : 'mean', 'sum' : 'sum', 'max' : 'maximum',
+		  'min' : 'minimum' }[ method ] + ' (interval: 1 ' + \
+		AGGREGATION_PERIODS[ period ] + ')'
+	if len( times ) == 0:
+		return data, times, attributes
+
+	## Indices at which a new period starts.
+	periods = times.astype( 'datetime64[' + period + ']' )
+	starts = numpy.flatnonzero( numpy.concatenate(
+		( [ True ], periods[ 1 : ] != periods[ : -1 ] ) ) )
+	if method in ( 'mean', 'sum' ):
+		valid = ~numpy.isnan( data )
+		result = numpy.add.reduceat( numpy.where( valid, data, 0 ), starts,
+									 axis = 0 )
+		if method == 'mean':
+			with numpy.errstate( invalid = 'ignore', divide = 'ignore' ):
+				result = result/numpy.add.reduceat(
+					valid.astype( numpy.int32 ), starts, axis = 0 )
+	elif method == 'max':
+		result = numpy.fmax.reduceat( data, starts, axis = 0 )
+	else:
+		result = numpy.fmin.reduceat( data, starts, axis = 0 )
+	return result.astype( data.dtype ), \
+		periods[ starts ].astype( times.dtype ), attributes
+
+## Predefined reducers. Each reducer takes the values of a variable
+## (with time as first dimension), its time coordinate (as
+## numpy.datetime64), and its attributes and returns the modified
+## versions of all three.
+daily_mean = functools.partial( aggregate_time, period = 'D',
+								method = 'mean' )
+daily_sum = functools.partial( aggregate_time, period = 'D',
+							   method = 'sum' )
+daily_max = functools.partial( aggregate_time, period = 'D',
+							   method = 'max' )
+daily_min = functools.partial( aggregate_time, period = 'D',
+							   method = 'min' )
+monthly_mean = functools.partial( aggregate_time, period = 'M',
+								  method = 'mean' )
+monthly_sum = functools.partial( aggregate_time, period = 'M',
+								 method = 'sum' )
+monthly_max = functools.partial( aggregate_time, period = 'M',
+								 method = 'max' )
+monthly_min = functools.partial( aggregate_time, period = 'M',
+								 method = 'min' )
+
+def kelvin_to_celsius( data, times, attributes ):
+	'''Converts a temperature field from Kelvin to degree Celsius.
+
+	See :func:`aggregate_time` for a description of the arguments and
+	the output.
+	'''
+	attributes = dict( attributes )
+	attributes[ 'units' ] = 'degC'
+	return data - 273.15, times, attributes
+
+def reduce_netcdf_file( file_name, output_name, reducers ):
+	'''Applies reducers to the variables of a chunk and writes the
+	result into a new NetCDF file.
+
+	Each reducer is a (picklable) function taking a
+	:class:`numpy.ndarray` containing the unpacked values of a
+	variable with time as its first dimension, the time coordinate as
+	*datetime64* array, and a dictionary of the variable's attributes
+	and returning the modified versions of all three. The reducers of
+	a variable are applied one after another.
+
+	In order to keep the memory consumption low, the chunk is
+	processed in blocks of one calendar month. Reducers aggregating
+	over periods longer than a month are thus not supported.
+
+	Only the variables listed in `reducers` are written to the
+	output, which is a NetCDF3 file (64-bit offset) containing
+	unpacked single precision values.
+
+	Parameters
+	----------
+	file_name : str
+	    Path to the downloaded chunk.
+	output_name : str
+	    Path to the reduced chunk.
+	reducers : dict
+	    A dictionary with the names of the variables as keys and
+	    either a single reducer or a list of them as values. Both the
+	    names of the variables in the NetCDF file (*t2m*) and the
+	    parameters of the MARS request (*2t*) can be used.
+
+	Returns
+	-------
+	int
+	   Returns 0 if everything worked out and no error was thrown.
+
+	Raises
+	------
+	ValueError
+	    If a variable is not present in `file_name`, has no time
+	    dimension, its reducers aggregate over periods longer than a
+	    month, or the reducers of different variables result in
+	    different time coordinates.
+
+	See Also
+	--------
+	aggregate_time : Basis of the predefined reducers.
+	retrieve : Applies the reducers to all chunks.
+	'''
+	import numpy
+	import netCDF4
+
+	## Attributes specifying the packing of the input.
+	packing_attributes = ( 'scale_factor', 'add_offset', '_FillValue',
+						   'missing_value' )
+
+	try:
+		with netCDF4.Dataset( file_name ) as input_handle, \
+			 netCDF4.Dataset( output_name, 'w',
+							  format = 'NETCDF3_64BIT_OFFSET' ) as output_handle:
+			variables = {}
+			for nname, rreducers in reducers.items():
+				name = NETCDF_PARAMETER_NAMES.get( nname, nname )
+				if name not in input_handle.variables:
+					raise ValueError( 'Variable "' + name +
+									  '" is not present in "' +
+									  str( file_name ) + '".' )
+				if input_handle.variables[ name ].dimensions[ 0 : 1 ] != \
+				   ( 'time', ):
+					raise ValueError( 'Variable "' + name +
+									  '" has no time dimension.' )
+				if callable( rreducers ):
+					rreducers = [ rreducers ]
+				variables[ name ] = list( rreducers )
+
+			## Decoding the time coordinate
+			time_input = input_handle.variables[ 'time' ]
+			calendar = getattr( time_input, 'calendar', 'standard' )
+			dates = netCDF4.num2date( time_input[ : ], time_input.units,
+									  calendar = calendar,
+									  only_use_cftime_datetimes = False,
+									  only_use_python_datetimes = True )
+			times = numpy.array( dates, dtype = 'datetime64[s]' ).reshape( -1 )
+
+			## All dimensions and coordinates except of time are
+			## copied. The headers of all reduced chunks of a request have
+			## to be identical in order to combine them without *ncrcat*.
+			output_handle.setncattr( 'history', 'Reduced by ecmwf_retrieve' )
+			output_handle.createDimension( 'time', None )
+			time_output = output_handle.createVariable( 'time', 'f8',
+														( 'time', ) )
+			time_output.units = time_input.units
+			time_output.calendar = calendar
+			for nname in variables:
+				for ddimension in input_handle.variables[ nname ].dimensions[ 1 : ]:
+					if ddimension in output_handle.dimensions:
+						continue
+					output_handle.createDimension(
+						ddimension, len( input_handle.dimensions[ ddimension ] ) )
+					if ddimension in input_handle.variables:
+						coordinate = input_handle.variables[ ddimension ]
+						coordinate_output = output_handle.createVariable(
+							ddimension, coordinate.dtype, coordinate.dimensions )
+						coordinate_output.setncatts(
+							{ kk : coordinate.getncattr( kk )
+							  for kk in coordinate.ncattrs() } )
+						coordinate_output[ : ] = coordinate[ : ]
+
+			## Process the chunk month by month.
+			months = times.astype( 'datetime64[M]' )
+			starts = list( numpy.flatnonzero( numpy.concatenate(
+				( [ True ], months[ 1 : ] != months[ : -1 ] ) ) ) ) + \
+				[ len( times ) ]
+			if len( times ) == 0:
+				starts = [ 0, 0 ]
+			index = 0
+			time_last = None
+			for bblock in range( len( starts ) - 1 ):
+				times_reduced = None
+				for nname, rreducers in variables.items():
+					variable = input_handle.variables[ nname ]
+					data = numpy.ma.filled( variable[
+						starts[ bblock ] : starts[ bblock + 1 ] ].astype(
+							numpy.float32 ), numpy.nan )
+					times_block = times[ starts[ bblock ] : starts[ bblock + 1 ] ]
+					attributes = { kk : variable.getncattr( kk )
+								   for kk in variable.ncattrs()
+								   if kk not in packing_attributes }
+					for rreducer in rreducers:
+						data, times_block, attributes = rreducer(
+							data, times_block, attributes )
+					if times_reduced is None:
+						times_reduced = times_block
+						## Reducers aggregating over periods longer than
+						## the blocks yield several records for the same
+						## period.
+						if numpy.any( numpy.diff( times_reduced ) <= \
+									  numpy.timedelta64( 0, 's' ) ) or \
+						   ( time_last is not None and
+							 len( times_reduced ) > 0 and
+							 times_reduced[ 0 ] <= time_last ):
+							raise ValueError( 'The reducers of "' + nname +
+											  '" aggregate over periods ' +
+											  'longer than a month.' )
+					elif not numpy.array_equal( times_reduced, times_block ):
+						raise ValueError( 'The reducers of the variables ' +
+										  'result in different time coordinates.' )
+					if nname not in output_handle.variables:
+						output = output_handle.createVariable(
+							nname, 'f4', variable.dimensions )
+						output.setncatts( attributes )
+					output_handle.variables[ nname ][
+						index : index + len( times_block ) ] = \
+						data.astype( numpy.float32 )
+				time_output[ index : index + len( times_reduced ) ] = \
+					netCDF4.date2num( times_reduced.astype( object ),
+									  time_input.units, calendar = calendar )
+				index += len( times_reduced )
+				if len( times_reduced ) > 0:
+					time_last = times_reduced[ -1 ]
+
+	except BaseException:
+		## Do not leave an incomplete output behind.
+		if os.path.isfile( output_name ):
+			os.remove( output_name )
+		raise
+
+	return 0
+
+def reduced_file_name( file_name ):
+	'''Name of the reduced version of a chunk.'''
+	return os.path.splitext( file_name )[ 0 ] + '_reduced.nc'
+
+def reduction_executor( workers ):
+	'''Pool of processes reducing the chunks.
+
+	The chunks are reduced while other threads are still downloading
+	and verifying. Forking such a process would copy locks held by
+	these threads (e.g. the one of the HDF5 library) into the workers
+	and might deadlock them. So the workers are started from a fresh
+	server process instead.
+	'''
+	import multiprocessing
+	if 'forkserver' in multiprocessing.get_all_start_methods():
+		context = multiprocessing.get_context( 'forkserver' )
+	else:
+		context = multiprocessing.get_context( 'spawn' )
+	return ProcessPoolExecutor( max_workers = max( 1, workers ),
+								mp_context = context )
+
+def check_order_of_reduced_files( file_names, time_last = None ):
+	'''Checks whether the reduced chunks follow each other in time.
+
+	Reducers aggregating over periods spanning several chunks (e.g. a
+	custom one mapping all values onto the beginning of the century)
+	yield records of the same period in consecutive chunks.
+
+	Parameters
+	----------
+	file_names : list
+	    Paths to the reduced chunks in temporal order.
+	time_last : datetime.datetime, optional
+	    Last time step of the chunk preceding `file_names`. Default =
+	    None.
+
+	Returns
+	-------
+	datetime.datetime or None
+	    The last time step of the chunks.
+
+	Raises
+	------
+	ValueError
+	    If a chunk starts not after the end of the preceding one.
+	'''
+	import netCDF4
+	for ffile in file_names:
+		with netCDF4.Dataset( ffile ) as handle:
+			time = handle.variables[ 'time' ]
+			if len( time ) == 0:
+				continue
+			dates = netCDF4.num2date(
+				[ time[ 0 ], time[ -1 ] ], time.units,
+				calendar = getattr( time, 'calendar', 'standard' ),
+				only_use_cftime_datetimes = False,
+				only_use_python_datetimes = True )
+		if time_last is not None and dates[ 0 ] <= time_last:
+			raise ValueError( 'The reduced chunk "' + str( ffile ) +
+							  '" overlaps the preceding one. The ' +
+							  'reducers aggregate over periods spanning ' +
+							  'several chunks.' )
+		time_last = dates[ 1 ]
+	return time_last
+
+def reduce_netcdf_files( file_names, reducers, workers = 1,
+						 delete = True ):
+	'''Reduces several chunks on a pool of processes.
+
+	Parameters
+	----------
+	file_names : list
+	    Paths to the downloaded chunks.
+	reducers : dict
+	    See :func:`reduce_netcdf_file`.
+	workers : int, optional
+	    Number of worker processes. Default = 1.
+	delete : bool, optional
+	    Whether or not to delete the original chunks once they are
+	    reduced. Default = True.
+
+	Returns
+	-------
+	list
+	    Paths to the reduced chunks.
+	'''
+	output_names = [ reduced_file_name( ff ) for ff in file_names ]
+	with reduction_executor( workers ) as executor:
+		futures = [ executor.submit( reduce_netcdf_file, ffile, ooutput,
+									 reducers )
+					for ffile, ooutput in zip( file_names, output_names ) ]
+		for ffile, ffuture in zip( file_names, futures ):
+			ffuture.result()
+			if delete:
+				os.remove( ffile )
+	return output_names
+
+def download_and_reduce_queries( server, options_list, reducers,
+								 workers = 1, verify = True, retries = 2,
+								 delete = True, checksums = None ):
+	'''Downloads a list of requests and reduces each chunk as soon as
+	it arrives.
+
+	The verification and reduction of the chunks are performed on a
+	pool of processes while the remaining chunks are still being
+	downloaded.
+
+	Parameters
+	----------
+	server : RetrievalBackend
+	    Object used to retrieve the data.
+	options_list : list
+	    A list of dictionaries specifying the requests of all chunks.
+	reducers : dict
+	    See :func:`reduce_netcdf_file`.
+	workers : int, optional
+	    Number of processes reducing the chunks. Default = 1.
+	verify : bool, optional
+	    Whether or not to check the chunks before reducing
+	    them. Default = True.
+	retries : int, optional
+	    Maximum number of times an invalid chunk will be downloaded
+	    again. Default = 2.
+	delete : bool, optional
+	    Whether or not to delete the original chunks once they are
+	    reduced. Default = True.
+	checksums : dict, optional
+	    See :func:`verify_netcdf_files`. Default = None.
+
+	Returns
+	-------
+	list
+	    Paths to the reduced chunks in the order of `options_list`.
+
+	Raises
+	------
+	IOError
+	    If a chunk is still invalid after `retries` additional
+	    downloads.
+	ValueError
+	    If the reduced chunks overlap in time. See
+	    :func:`check_order_of_reduced_files`.
+
+	See Also
+	--------
+	retrieve : Function handling the whole request.
+	reduce_netcdf_file : Reduces a single chunk.
+	'''
+	if checksums is None:
+		checksums = {}
+	with reduction_executor( workers ) as executor:
+		def download_and_submit( options ):
+			target = options.get( 'target' )
+			for aattempt in range( retries + 1 ):
+				if aattempt > 0:
+					print( "\nDownloading the invalid chunk again...\n" )
+					if os.path.isfile( target ):
+						os.remove( target )
+				server.retrieve( options )
+				if not verify:
+					break
+				## The netCDF-C library is not thread-safe. So the
+				## chunk is checked by one of the workers instead of
+				## this download thread.
+				problem = executor.submit(
+					verify_netcdf_file, target, options,
+					checksums.get( os.path.basename( target ) ) ).result()
+				if problem is None:
+					break
+				print( "\nChunk " + target + " is invalid: " + problem )
+			else:
+				raise IOError( 'The following chunks are still invalid ' +
+							   'after ' + str( retries ) + ' retries: ' +
+							   target )
+			return executor.submit( reduce_netcdf_file, target,
+									reduced_file_name( target ), reducers )
+
+		download_workers = getattr( server, 'capacity', 1 )
+		with ThreadPoolExecutor(
+				max_workers = max( 1, download_workers ) ) as downloader:
+			futures = list( downloader.map( download_and_submit,
+											options_list ) )
+		for ooptions, ffuture in zip( options_list, futures ):
+			ffuture.result()
+			if delete:
+				os.remove( ooptions.get( 'target' ) )
+
+	output_names = [ reduced_file_name( oo.get( 'target' ) )
+					 for oo in options_list ]
+	check_order_of_reduced_files( output_names )
+	return output_names
+
+def _free_space( path ):
+	'''Number of bytes available on the file system containing
+	`path`.'''
+	return shutil.disk_usage( path ).free
+
+def _same_device( path_a, path_b ):
+	'''Whether `path_a` and `path_b` reside on the same file
+	system.'''
+	return os.stat( path_a ).st_dev == os.stat( path_b ).st_dev
+
+def retrieve( options = None, delete = True, workers = 1, verify = True,
+			  retries = 2, credentials = None, backend = None,
+			  disk_budget = None, scratch_dir = None, reducers = None,
+			  checksums = None ):
 	'''Downloads a public data set of arbitrary size from the ECMWF
 	using only a free account.
 
@@ -424,7 +2159,10 @@ def retrieve( options = None, delete = True ):
 	CERA-20C data set can easily exceed the 30GB limit.
 
 	The resulting data set will be stored in the current folder the
-	python script is called in.
+	python script is called in (or in the one specified in the
+	*target* key of `options`). The individual chunks are downloaded
+	into a separate folder for each call of this function. So several
+	retrievals can run in the same folder at the same time.
 
 	Parameters
 	----------
@@ -440,16 +2178,71 @@ def retrieve( options = None, delete = True ):
 	   Logical value specifying whether or not to delete the
 	   downloaded chunk NetCDF files joined by this function. Default
 	   = True. 
+	workers : int, optional
+	   Number of processes used to combine (and reduce) the
+	   downloaded chunks. See :func:`combine_netcdf_files_parallel`.
+	   Default = 1.
+	verify : bool, optional
+	   Logical value specifying whether or not to check the
+	   downloaded chunks before combining them. Invalid ones
+	   (e.g. truncated downloads) will be downloaded again. See
+	   :func:`verify_netcdf_file`. Default = True.
+	retries : int, optional
+	   Maximum number of times an invalid chunk will be downloaded
+	   again. Default = 2.
+	checksums : dict, optional
+	   Expected SHA-256 checksums of the chunks using their base
+	   names (e.g. *era-interim_000_.nc*) as keys. Only used if
+	   `verify` is *True*. Default = None.
+	credentials : list, optional
+	   Credentials of several accounts at the ECMWF. If provided, the
+	   chunks will be downloaded concurrently using all of them. See
+	   :class:`ECMWFServerPool` for details. If *None*, the account
+	   specified in *~/.ecmwfapirc* will be used. Default = None.
+	backend : RetrievalBackend or str, optional
+	   Backend used to retrieve the individual chunks. Either an
+	   object providing a *retrieve* method or the name of a backend
+	   in *BACKENDS* (created without arguments, so backends requiring
+	   some have to be passed as objects). If *None*, an
+	   :class:`ECMWFAPIBackend` will be used. Ignored if
+	   `credentials` are provided. Default = None.
+	disk_budget : int, optional
+	   Maximum number of bytes the retrieval may occupy on the
+	   disk. If provided, the free space will be checked against the
+	   estimated size of the output (see :func:`estimate_chunk_size`)
+	   before downloading anything. Each chunk will be appended to
+	   the output and deleted as soon as it is downloaded and only as
+	   many chunks are downloaded at once as fit into the remaining
+	   budget. `delete` is ignored in this case. Default = None.
+	scratch_dir : str, optional
+	   Folder in which the session folder containing the downloaded
+	   chunks will be created, e.g. on a local SSD. If *None*, the
+	   folder of the output will be used. Default = None.
+	reducers : dict, optional
+	   Reducers applied to each chunk as soon as it is downloaded,
+	   e.g. *{ '2t' : [ kelvin_to_celsius, daily_mean ] }*. Only the
+	   reduced variables are combined into the output. The reduction
+	   runs on a pool of `workers` processes. See
+	   :func:`reduce_netcdf_file` for details. Default = None.
 
 	Returns
 	-------
 	int
 	   Returns 0 if everything worked out and no error was thrown.
 
+	Raises
+	------
+	TypeError
+	   If `options` is not a dictionary.
+	IOError
+	   If the estimated size of the output exceeds the `disk_budget`
+	   or the free space on the disk.
+
 	Notes
 	-----
-	The function will internally generate an instance of an
-	:class:`ecmwfapi.ECMWFDataServer` object to handle the actual download. 
+	By default, the function will internally generate an instance of
+	an :class:`ecmwfapi.ECMWFDataServer` object to handle the actual
+	download. 
 
 	See Also
 	--------
@@ -458,8 +2251,13 @@ def retrieve( options = None, delete = True ):
 	split_query_into_list_of_queries : Splits the original request
 	   into smaller parts, which do not exceed the 30GB limit.
 	download_queries : Downloads a list of requests.
+	redownload_invalid_queries : Verifies the downloaded chunks.
 	combine_netcdf_files : Combines the individual requests into a
 	   single netCDF file.
+	download_and_append_queries : Combines the requests as soon as
+	   they are downloaded.
+	download_and_reduce_queries : Reduces the requests as soon as
+	   they are downloaded.
 	'''
 	## Check the type of the provided input
 	if options is not None and type( options ) is not dict:
@@ -480,27 +2278,453 @@ def retrieve( options = None, delete = True ):
 	## number of years provided in the temporal range.
 	options_split = split_query_into_list_of_queries( options )
 
-	## In addition there will also be a session key created from the
-	## current time and date to identify all the files in the download
-	## folder produced by this script
-	session_key = int( time.mktime(
-		datetime.datetime.now().timetuple() ) )
-	## Append the session key to the filenames
+	output_directory = os.path.dirname(
+		os.path.abspath( options.get( 'target' ) ) )
+	if scratch_dir is None:
+		scratch_dir = output_directory
+
+	## Check whether there is enough space for the output and at
+	## least one pending chunk before downloading anything. The
+	## chunks reside in the scratch folder, which might be located
+	## on a different file system than the output.
+	if disk_budget is not None:
+		chunk_sizes = [ estimate_chunk_size( oo ) for oo in options_split ]
+		output_size = sum( chunk_sizes )
+		output_free = _free_space( output_directory )
+		if _same_device( scratch_dir, output_directory ):
+			scratch_free = output_free - output_size
+		else:
+			scratch_free = _free_space( scratch_dir )
+		if disk_budget < output_size + max( chunk_sizes ):
+			raise IOError( 'Disk budget exceeded: the retrieval requires ' +
+						   'about ' + str( output_size + max( chunk_sizes ) ) +
+						   ' bytes but the budget is only ' +
+						   str( disk_budget ) + ' bytes.' )
+		if output_free < output_size:
+			raise IOError( 'Not enough disk space: the output requires ' +
+						   'about ' + str( output_size ) + ' bytes but ' +
+						   'only ' + str( output_free ) + ' bytes are ' +
+						   'available in ' + output_directory + '.' )
+		if scratch_free < max( chunk_sizes ):
+			raise IOError( 'Not enough disk space: a chunk requires ' +
+						   'about ' + str( max( chunk_sizes ) ) +
+						   ' bytes but only ' +
+						   str( max( scratch_free, 0 ) ) +
+						   ' bytes are available in ' + scratch_dir + '.' )
+		max_pending = int( min( disk_budget - output_size, scratch_free )//
+						   max( chunk_sizes ) )
+
+	## All chunks of this session are stored in a folder of their
+	## own. This way the combination does not have to scan the
+	## output folder and concurrent sessions do not interfere.
+	session_dir = tempfile.mkdtemp(
+		prefix = '.' + os.path.basename( options.get( 'target' ) ) + '.',
+		dir = scratch_dir )
 	for ll in range( len( options_split ) ):
-		options_split[ ll ][ 'target' ] = \
-		  ".".join( options_split[ ll ].get( 'target'
-											).split( "." )[ :-1 ] ) + \
-						'_' + str( session_key ) + '_.nc'
+		options_split[ ll ][ 'target' ] = os.path.join(
+			session_dir, os.path.basename( options_split[ ll ][ 'target' ] ) )
 
-	## Object representing the data server of the ECMWF
-	server = ECMWFDataServer()
+	try:
+		## Object representing the data server of the ECMWF
+		if credentials is not None:
+			server = ECMWFServerPool( credentials = credentials )
+		elif backend is None:
+			server = ECMWFAPIBackend()
+		elif type( backend ) is str:
+			server = get_backend( backend )
+		else:
+			server = backend
 
-	## Download the list of provided queries
-	download_queries( server, options_split )
+		if disk_budget is not None:
+			## Merge each chunk as soon as it is downloaded.
+			download_and_append_queries( server, options_split,
+										 options.get( 'target' ),
+										 max_pending = max_pending,
+										 verify = verify, retries = retries,
+										 reducers = reducers,
+										 workers = workers,
+										 checksums = checksums )
+			os.rmdir( session_dir )
+			return 0
+
+		if reducers is not None:
+			## Reduce each chunk while the remaining ones are still
+			## downloaded.
+			files = download_and_reduce_queries(
+				server, options_split, reducers, workers = workers,
+				verify = verify, retries = retries, delete = delete,
+				checksums = checksums )
+		else:
+			## Download the list of provided queries
+			download_queries( server, options_split )
+
+			## Check all chunks for integrity and download the invalid
+			## ones again.
+			if verify:
+				redownload_invalid_queries( server, options_split,
+											retries = retries,
+											checksums = checksums )
+			files = [ oo.get( 'target' ) for oo in options_split ]
+
+		## Combine the individual NetCDF files into a single,
+		## comprehensive one.
+		combine_netcdf_files( output_name = options.get( 'target' ),
+							  files = files, delete = delete,
+							  workers = workers )
+		if delete:
+			os.rmdir( session_dir )
+		else:
+			print( "\nThe chunk files are kept in " + session_dir + "\n" )
+	except BaseException:
+		## Keep the chunks downloaded so far for inspection.
+		if os.path.isdir( session_dir ):
+			if len( os.listdir( session_dir ) ) == 0:
+				os.rmdir( session_dir )
+			else:
+				print( "\nThe retrieval failed. The chunk files are kept in " +
+					   session_dir + "\n" )
+		raise
 
-	## Combine the individual NetCDF files into a single,
-	## comprehensive one.
-	combine_netcdf_files( output_name = options.get( 'target' ),
-						  session_key = session_key, delete = delete )
-	
 	return 0
+
+## Mapping of the type codes used in the header of NetCDF3 files onto
+## the corresponding (big-endian) NumPy data types.
+NETCDF3_TYPES = { 1 : 'i1', 2 : 'S1', 3 : '>i2', 4 : '>i4', 5 : '>f4',
+				  6 : '>f8' }
+
+def read_netcdf_header( file_name ):
+	'''Parses the header of a NetCDF3 file.
+
+	Both the classic and the 64-bit offset format are
+	supported. Since the data of all variables in these formats are
+	stored at fixed offsets, the header contains all information
+	necessary to access them without the help of the **netCDF4**
+	library.
+
+	The file format is described in
+	https://www.unidata.ucar.edu/software/netcdf/docs/file_format_specifications.html
+
+	Parameters
+	----------
+	file_name : str
+	    Path to a NetCDF3 file.
+
+	Returns
+	-------
+	dict
+	    A dictionary containing the *version* (1 for classic and 2
+	    for 64-bit offset) of the format, the number of records
+	    *numrecs*, the size of the header in bytes *header_size*, the
+	    size in bytes of a single record spanning all record
+	    variables *record_size*, the offset at which the record
+	    variables start *record_start*, a list of tuples containing
+	    the name and length of all *dimensions* (a length of zero
+	    marks the unlimited one), a dictionary of the global
+	    *attributes*, and a dictionary of all *variables*. Each of the
+	    latter is itself a dictionary containing its *dimensions*,
+	    *shape*, *dtype*, *attributes*, the byte offset *begin* of
+	    its data, and a logical value *record* indicating whether it
+	    spans the unlimited dimension.
+
+	Raises
+	------
+	ValueError
+	    If `file_name` is not a valid NetCDF3 file or its header is
+	    truncated.
+
+	See Also
+	--------
+	read_netcdf_memmap : Uses this function to access the variables
+	    via memory mapping.
+	'''
+	import numpy
+	with open( file_name, 'rb' ) as handle:
+		def read( size ):
+			buffer = handle.read( size )
+			if len( buffer ) != size:
+				raise ValueError( 'Truncated NetCDF3 header in "' +
+								  str( file_name ) + '".' )
+			return buffer
+
+		def read_int():
+			return struct.unpack( '>i', read( 4 ) )[ 0 ]
+
+		def read_name():
+			## Names are padded to a multiple of four bytes.
+			length = read_int()
+			name = read( length ).decode( 'utf-8' )
+			read( ( 4 - length % 4 ) % 4 )
+			return name
+
+		def read_dtype( nc_type ):
+			if nc_type not in NETCDF3_TYPES:
+				raise ValueError( 'Unknown data type ' + str( nc_type ) +
+								  ' in "' + str( file_name ) + '".' )
+			return numpy.dtype( NETCDF3_TYPES[ nc_type ] )
+
+		def read_attributes():
+			attributes = {}
+			tag = read_int()
+			number = read_int()
+			if tag == 0:
+				return attributes
+			elif tag != 12:
+				raise ValueError( 'Unexpected attribute tag in "' +
+								  str( file_name ) + '".' )
+			for _ in range( number ):
+				name = read_name()
+				nc_type = read_int()
+				nelems = read_int()
+				dtype = read_dtype( nc_type )
+				size = nelems*dtype.itemsize
+				values = read( size )
+				read( ( 4 - size % 4 ) % 4 )
+				if nc_type == 2:
+					attributes[ name ] = values.rstrip( b'\x00' ).decode(
+						'utf-8', 'replace' )
+				else:
+					values = numpy.frombuffer( values, dtype = dtype ).astype(
+						dtype.newbyteorder( '=' ) )
+					if nelems == 1:
+						values = values[ 0 ]
+					attributes[ name ] = values
+			return attributes
+
+		magic = read( 4 )
+		if magic[ 0 : 3 ] != b'CDF' or magic[ 3 ] not in ( 1, 2 ):
+			raise ValueError( '"' + str( file_name ) +
+							  '" is not a NetCDF3 classic or 64-bit offset file.' )
+		version = magic[ 3 ]
+		numrecs = struct.unpack( '>I', read( 4 ) )[ 0 ]
+
+		## List of all dimensions
+		dimensions = []
+		tag = read_int()
+		number = read_int()
+		if tag not in ( 0, 10 ):
+			raise ValueError( 'Unexpected dimension tag in "' +
+							  str( file_name ) + '".' )
+		for _ in range( number ):
+			name = read_name()
+			dimensions.append( ( name, read_int() ) )
+
+		attributes = read_attributes()
+
+		## List of all variables
+		variables = {}
+		tag = read_int()
+		number = read_int()
+		if tag not in ( 0, 11 ):
+			raise ValueError( 'Unexpected variable tag in "' +
+							  str( file_name ) + '".' )
+		for _ in range( number ):
+			name = read_name()
+			ndims = read_int()
+			dimids = [ read_int() for _ in range( ndims ) ]
+			for ii in dimids:
+				if ii < 0 or ii >= len( dimensions ):
+					raise ValueError( 'Invalid dimension id ' + str( ii ) +
+									  ' of variable "' + name + '" in "' +
+									  str( file_name ) + '".' )
+			variable_attributes = read_attributes()
+			nc_type = read_int()
+			vsize = struct.unpack( '>I', read( 4 ) )[ 0 ]
+			if version == 1:
+				begin = struct.unpack( '>I', read( 4 ) )[ 0 ]
+			else:
+				begin = struct.unpack( '>Q', read( 8 ) )[ 0 ]
+			variables[ name ] = {
+				'dimensions' : tuple( dimensions[ ii ][ 0 ]
+									  for ii in dimids ),
+				'shape' : [ dimensions[ ii ][ 1 ] for ii in dimids ],
+				'dtype' : read_dtype( nc_type ),
+				'attributes' : variable_attributes,
+				'vsize' : vsize,
+				'begin' : begin,
+				'record' : ndims > 0 and dimensions[ dimids[ 0 ] ][ 1 ] == 0 }
+		header_size = handle.tell()
+		file_size = os.fstat( handle.fileno() ).st_size
+
+	## The record variables are interleaved. Each record contains one
+	## slice of every one of them. In case there is only a single
+	## record variable its slices are not padded.
+	record_variables = [ vv for vv in variables.values() if vv[ 'record' ] ]
+	if len( record_variables ) == 1:
+		record_size = record_variables[ 0 ][ 'dtype' ].itemsize
+		for ll in record_variables[ 0 ][ 'shape' ][ 1 : ]:
+			record_size *= ll
+	else:
+		record_size = sum( vv[ 'vsize' ] for vv in record_variables )
+	if len( record_variables ) > 0:
+		record_start = min( vv[ 'begin' ] for vv in record_variables )
+	else:
+		record_start = file_size
+
+	## A number of records of 2^32 - 1 indicates the file is still
+	## being written (streaming). The actual number has to be derived
+	## from the size of the file.
+	if numrecs == 0xFFFFFFFF:
+		if record_size > 0:
+			numrecs = max( 0, ( file_size - record_start )//record_size )
+		else:
+			numrecs = 0
+	for vv in record_variables:
+		vv[ 'shape' ][ 0 ] = numrecs
+	for vv in variables.values():
+		vv[ 'shape' ] = tuple( vv[ 'shape' ] )
+
+	return { 'version' : version, 'numrecs' : numrecs,
+			 'header_size' : header_size, 'record_size' : record_size,
+			 'record_start' : record_start, 'dimensions' : dimensions,
+			 'attributes' : attributes, 'variables' : variables }
+
+class NetCDFMemmapVariable( object ):
+	'''Read-only view of a single variable in a NetCDF3 file.
+
+	The raw values are accessed via a memory map of the file and the
+	*scale_factor* and *add_offset* attributes are only applied to
+	the slice requested via indexing. Several processes reading the
+	same file thus share a single copy in the page cache of the
+	operating system.
+
+	Parameters
+	----------
+	name : str
+	    Name of the variable.
+	dimensions : tuple
+	    Names of the dimensions spanned by the variable.
+	attributes : dict
+	    Attributes of the variable.
+	data : numpy.ndarray
+	    Read-only view of the raw values within the memory map.
+
+	Notes
+	-----
+	When the variable is packed or of a floating point type, values
+	matching its *_FillValue* or *missing_value* attribute will be
+	replaced by *NaN*.
+
+	See Also
+	--------
+	read_netcdf_memmap : Opens all variables of a file.
+	'''
+	def __init__( self, name, dimensions, attributes, data ):
+		self.name = name
+		self.dimensions = dimensions
+		self.attributes = attributes
+		self.data = data
+
+	@property
+	def shape( self ):
+		return self.data.shape
+
+	@property
+	def ndim( self ):
+		return self.data.ndim
+
+	def __len__( self ):
+		return len( self.data )
+
+	def __repr__( self ):
+		return 'NetCDFMemmapVariable( ' + self.name + ', ' + \
+			str( self.dimensions ) + ', ' + str( self.shape ) + ' )'
+
+	def __getitem__( self, key ):
+		import numpy
+		values = self.data[ key ]
+		scale_factor = self.attributes.get( 'scale_factor' )
+		add_offset = self.attributes.get( 'add_offset' )
+		fill_value = self.attributes.get(
+			'_FillValue', self.attributes.get( 'missing_value' ) )
+		if scale_factor is None and add_offset is None:
+			if fill_value is not None and \
+			   numpy.issubdtype( self.data.dtype, numpy.floating ):
+				values = numpy.where( values == fill_value, numpy.nan,
+									  values )
+			return values
+
+		## Unpack the values of the requested slice only.
+		result = numpy.asarray( values, dtype = numpy.float64 )
+		if scale_factor is not None:
+			result = result*scale_factor
+		if add_offset is not None:
+			result = result + add_offset
+		if fill_value is not None:
+			result = numpy.where( values == fill_value, numpy.nan, result )
+		return result
+
+def read_netcdf_memmap( file_name ):
+	'''Opens all variables of a NetCDF3 file as memory-mapped arrays.
+
+	In contrast to the **netCDF4** package, which copies the values of
+	a variable into memory, this function parses the header of the
+	file just once and exposes each variable as a read-only view into
+	a :class:`numpy.memmap` of the whole file. This way several
+	processes analysing the same (possibly huge) combined data set
+	share one copy of it in the page cache.
+
+	Parameters
+	----------
+	file_name : str
+	    Path to a NetCDF3 file in classic or 64-bit offset
+	    format. This is the format of the files delivered by the MARS
+	    server of the ECMWF.
+
+	Returns
+	-------
+	dict
+	    A dictionary with the names of the variables as keys and
+	    :class:`NetCDFMemmapVariable` objects as values.
+
+	Raises
+	------
+	ValueError
+	    If `file_name` is not a valid NetCDF3 file or is too short to
+	    contain all its variables.
+
+	See Also
+	--------
+	read_netcdf_header : Parses the header of a NetCDF3 file.
+	NetCDFMemmapVariable : Lazily applies the unpacking of the values.
+	'''
+	import numpy
+	header = read_netcdf_header( file_name )
+	if os.path.getsize( file_name ) == 0:
+		raise ValueError( 'Empty file "' + str( file_name ) + '".' )
+	memmap = numpy.memmap( file_name, dtype = numpy.uint8, mode = 'r' )
+
+	variables = {}
+	for nname, vvariable in header[ 'variables' ].items():
+		dtype = vvariable[ 'dtype' ]
+		shape = vvariable[ 'shape' ]
+		## Strides of a C-contiguous array.
+		strides = []
+		stride = dtype.itemsize
+		for ll in reversed( shape ):
+			strides.insert( 0, stride )
+			stride *= ll
+		if vvariable[ 'record' ]:
+			## Consecutive records are separated by the slices of all
+			## other record variables.
+			strides[ 0 ] = header[ 'record_size' ]
+		if 0 in shape:
+			## Nothing to map (e.g. a file without any records).
+			data = numpy.zeros( shape, dtype = dtype )
+			data.flags.writeable = False
+			variables[ nname ] = NetCDFMemmapVariable(
+				nname, vvariable[ 'dimensions' ], vvariable[ 'attributes' ],
+				data )
+			continue
+		try:
+			data = numpy.ndarray( shape, dtype = dtype, buffer = memmap,
+								  offset = vvariable[ 'begin' ],
+								  strides = tuple( strides ) )
+		except ( TypeError, ValueError ):
+			raise ValueError( 'The file "' + str( file_name ) +
+							  '" is too short to contain the variable "' +
+							  nname + '".' )
+		variables[ nname ] = NetCDFMemmapVariable(
+			nname, vvariable[ 'dimensions' ], vvariable[ 'attributes' ],
+			data )
+
+	return variables
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+## Using the python 3.6
+
+## Compares the serial combination of the chunk files using a single
+## `ncrcat` call with the parallel one using a pool of processes. The
+## chunks are synthetic files mimicking a monthly splitting of a
+## 6-hourly ERA-Interim request on the 0.75/0.75 grid. All of them
+## share the same packing. Chunks with different *scale_factor* and
+## *add_offset* attributes are joined by a single `ncrcat` call
+## regardless of the number of workers.
+##
+## Usage: python benchmark-combine.py [number of chunks]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy
+import netCDF4
+import ecmwf_retrieve.ecmwf_retrieve as ec
+
+number_of_chunks = int( sys.argv[ 1 ] ) if len( sys.argv ) > 1 else 48
+records_per_chunk = 120
+
+directory = tempfile.mkdtemp()
+file_names = []
+print( "Creating " + str( number_of_chunks ) + " chunk files in " +
+	   directory + "..." )
+for ll in range( number_of_chunks ):
+	file_names.append( os.path.join(
+		directory, 'benchmark_' + str( ll ).zfill( 3 ) + '_.nc' ) )
+	with netCDF4.Dataset( file_names[ -1 ], 'w',
+						  format = 'NETCDF3_64BIT_OFFSET' ) as handle:
+		handle.createDimension( 'longitude', 480 )
+		handle.createDimension( 'latitude', 241 )
+		handle.createDimension( 'time', None )
+		handle.createVariable( 'longitude', 'f4', ( 'longitude', ) )[ : ] = \
+			numpy.arange( 480 )*0.75
+		handle.createVariable( 'latitude', 'f4', ( 'latitude', ) )[ : ] = \
+			90. - numpy.arange( 241 )*0.75
+		times = handle.createVariable( 'time', 'i4', ( 'time', ) )
+		times.units = 'hours since 1900-01-01 00:00:0.0'
+		times[ : ] = ( ll*records_per_chunk + \
+					   numpy.arange( records_per_chunk ) )*6
+		for pparam in [ 't2m', 'sst' ]:
+			variable = handle.createVariable(
+				pparam, 'i2', ( 'time', 'latitude', 'longitude' ) )
+			variable.scale_factor = 0.01
+			variable.add_offset = 270.
+			variable.set_auto_maskandscale( False )
+			variable[ : ] = numpy.random.randint(
+				-32000, 32000, size = ( records_per_chunk, 241, 480 ),
+				dtype = numpy.int16 )
+
+def benchmark( label, function ):
+	output_name = os.path.join( directory, 'combined.nc' )
+	time_start = time.time()
+	function( output_name )
+	duration = time.time() - time_start
+	print( label.ljust( 24 ) + "%8.2f s" % duration )
+	os.remove( output_name )
+
+if shutil.which( 'ncrcat' ) is not None:
+	benchmark( "serial (ncrcat)", lambda output_name : os.system(
+		"ncrcat " + " ".join( file_names ) + " -o " + output_name ) )
+else:
+	print( "ncrcat not found. Skipping the serial benchmark." )
+for wworkers in [ 1, 2, 4, 8 ]:
+	benchmark( "parallel, " + str( wworkers ) + " workers",
+			   lambda output_name : ec.combine_netcdf_files_parallel(
+				   output_name, file_names, workers = wworkers ) )
+
+shutil.rmtree( directory )
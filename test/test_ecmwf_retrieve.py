@@ -1,11 +1,75 @@
 ## Some unit tests for the functions in the `ecmwf_retrieve` package.
 
+import os
+import shutil
+import tempfile
+import sys
+import time
+import datetime
+import subprocess
+import functools
+import threading
 import unittest
+import unittest.mock
+import numpy
+import netCDF4
 import ecmwf_retrieve.ecmwf_retrieve as ec
 
 default_era = ec.erainterim_default_options()
 default_cera = ec.cera20_default_options()
 
+def create_chunk( file_name, date = '1979-01-01/to/1979-01-02',
+				  times = 4, params = ( 't2m', 'sst' ),
+				  file_format = 'NETCDF3_64BIT_OFFSET' ):
+	'''Writes a small NetCDF file mimicking the output of the MARS
+	server for the temporal range `date` and returns the unpacked
+	values of its variables.'''
+	dates = date.split( '/' )
+	start = datetime.datetime.strptime( dates[ 0 ], '%Y-%m-%d' )
+	end = datetime.datetime.strptime( dates[ -1 ], '%Y-%m-%d' )
+	steps = ( ( end - start ).days + 1 )*times
+	hours = ( start - datetime.datetime( 1900, 1, 1 ) ).days*24 + \
+		numpy.arange( steps )*24//times
+	values = {}
+	with netCDF4.Dataset( file_name, 'w', format = file_format ) as handle:
+		handle.createDimension( 'longitude', 4 )
+		handle.createDimension( 'latitude', 3 )
+		handle.createDimension( 'time', None )
+		longitude = handle.createVariable( 'longitude', 'f4',
+										   ( 'longitude', ) )
+		longitude[ : ] = numpy.arange( 4 )*90.
+		latitude = handle.createVariable( 'latitude', 'f4', ( 'latitude', ) )
+		latitude[ : ] = [ 90., 0., -90. ]
+		time = handle.createVariable( 'time', 'i4', ( 'time', ) )
+		time.units = 'hours since 1900-01-01 00:00:0.0'
+		time.calendar = 'gregorian'
+		time[ : ] = hours
+		for ii, pparam in enumerate( params ):
+			variable = handle.createVariable(
+				pparam, 'i2', ( 'time', 'latitude', 'longitude' ),
+				fill_value = -32767 )
+			variable.scale_factor = 0.01
+			variable.add_offset = 270. + ii
+			variable.units = 'K'
+			variable.set_auto_maskandscale( False )
+			packed = ( numpy.arange( steps*12 ).reshape( steps, 3, 4 ) + \
+					   hours[ 0 ] + ii ) % 30000
+			variable[ : ] = packed
+			values[ pparam ] = packed*0.01 + 270. + ii
+	return values
+
+class TemporaryDirectoryTestCase( unittest.TestCase ):
+	'''Runs each test within a temporary directory of its own.'''
+
+	def setUp( self ):
+		self.directory = tempfile.mkdtemp()
+		self.working_directory = os.getcwd()
+		os.chdir( self.directory )
+
+	def tearDown( self ):
+		os.chdir( self.working_directory )
+		shutil.rmtree( self.directory )
+
 class TestStringSplitting( unittest.TestCase ):
 
 	def test_exception_handling_in_string_splitting( self ):
@@ -63,5 +127,707 @@ class TestDictHandling( unittest.TestCase ):
 		with self.assertRaises( TypeError ):
 			ec.retrieve( 1979 )
 		
+class TestMemmapReader( TemporaryDirectoryTestCase ):
+
+	def test_reading_of_netcdf3_formats( self ):
+		print( 'Test, whether the memory-mapped reader matches the netCDF4 package.\n' )
+		for ffile_format in [ 'NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET' ]:
+			for pparams in [ ( 't2m', ), ( 't2m', 'sst' ) ]:
+				file_name = os.path.join( self.directory, 'chunk.nc' )
+				values = create_chunk( file_name, params = pparams,
+									   file_format = ffile_format )
+				variables = ec.read_netcdf_memmap( file_name )
+				self.assertEqual( sorted( variables.keys() ),
+								  sorted( ( 'latitude', 'longitude',
+											'time' ) + pparams ) )
+				for pparam in pparams:
+					self.assertEqual( variables[ pparam ].dimensions,
+									  ( 'time', 'latitude', 'longitude' ) )
+					self.assertEqual( variables[ pparam ].shape, ( 8, 3, 4 ) )
+					numpy.testing.assert_allclose(
+						variables[ pparam ][ : ], values[ pparam ] )
+					numpy.testing.assert_allclose(
+						variables[ pparam ][ 3, 1:, ::2 ],
+						values[ pparam ][ 3, 1:, ::2 ] )
+					self.assertAlmostEqual( variables[ pparam ][ 2, 1, 3 ],
+											values[ pparam ][ 2, 1, 3 ] )
+					self.assertFalse( variables[ pparam ].data.flags.writeable )
+				with netCDF4.Dataset( file_name ) as handle:
+					numpy.testing.assert_array_equal(
+						variables[ 'time' ][ : ], handle[ 'time' ][ : ] )
+				del variables
+
+	def test_rejection_of_invalid_files( self ):
+		print( 'Test, whether the memory-mapped reader rejects invalid files.\n' )
+		file_name = os.path.join( self.directory, 'chunk.nc' )
+		create_chunk( file_name, file_format = 'NETCDF4' )
+		with self.assertRaises( ValueError ):
+			ec.read_netcdf_memmap( file_name )
+		create_chunk( file_name )
+		with open( file_name, 'r+b' ) as handle:
+			handle.truncate( os.path.getsize( file_name ) - 100 )
+		with self.assertRaises( ValueError ):
+			ec.read_netcdf_memmap( file_name )
+		## Corrupt the type of the first variable (behind its padded
+		## name, number of dimensions, dimension ID, and empty
+		## attribute list).
+		create_chunk( file_name, params = () )
+		with open( file_name, 'rb' ) as handle:
+			content = bytearray( handle.read() )
+		position = content.index( b'longitude', content.index(
+			b'longitude' ) + 9 ) + 12 + 4 + 4 + 8
+		content[ position : position + 4 ] = b'\x00\x00\x00\x2a'
+		with open( file_name, 'wb' ) as handle:
+			handle.write( content )
+		with self.assertRaises( ValueError ):
+			ec.read_netcdf_header( file_name )
+		## Corrupt the ID of the dimension spanned by the first
+		## variable.
+		for iid in [ b'\x00\x00\x00\x09', b'\xff\xff\xff\xff' ]:
+			create_chunk( file_name, params = () )
+			with open( file_name, 'rb' ) as handle:
+				content = bytearray( handle.read() )
+			position = content.index( b'longitude', content.index(
+				b'longitude' ) + 9 ) + 12 + 4
+			content[ position : position + 4 ] = iid
+			with open( file_name, 'wb' ) as handle:
+				handle.write( content )
+			with self.assertRaises( ValueError ):
+				ec.read_netcdf_header( file_name )
+			self.assertIsNone( ec.read_netcdf_record_layout( [ file_name ] ) )
+
+	def test_masking_of_unpacked_variables( self ):
+		print( 'Test, whether fill values of unpacked variables are masked.\n' )
+		file_name = os.path.join( self.directory, 'chunk.nc' )
+		with netCDF4.Dataset( file_name, 'w',
+							  format = 'NETCDF3_CLASSIC' ) as handle:
+			handle.createDimension( 'time', None )
+			variable = handle.createVariable( 't2m', 'f4', ( 'time', ),
+											  fill_value = -999. )
+			variable[ : ] = numpy.ma.masked_values( [ 1., -999., 3. ],
+													-999. )
+			counts = handle.createVariable( 'counts', 'i4', ( 'time', ),
+											fill_value = -1 )
+			counts[ : ] = [ 1, 2, 3 ]
+		variables = ec.read_netcdf_memmap( file_name )
+		numpy.testing.assert_array_equal( variables[ 't2m' ][ : ],
+										  [ 1., numpy.nan, 3. ] )
+		self.assertTrue( numpy.isnan( variables[ 't2m' ][ 1 ] ) )
+		numpy.testing.assert_array_equal( variables[ 'counts' ][ : ],
+										  [ 1, 2, 3 ] )
+		del variables
+
+class TestParallelCombination( TemporaryDirectoryTestCase ):
+
+	def create_chunks( self ):
+		dates = [ '1979-12-30/to/1979-12-31', '1980-01-01/to/1980-01-03',
+				  '1981-01-01/to/1981-01-01' ]
+		file_names = []
+		values = []
+		for ll, ddate in enumerate( dates ):
+			file_names.append( os.path.join(
+				self.directory, 'chunk_' + str( ll ).zfill( 3 ) + '_.nc' ) )
+			values.append( create_chunk( file_names[ -1 ], date = ddate ) )
+		return file_names, values
+
+	def test_parallel_record_copying( self ):
+		print( 'Test, whether chunks with matching headers are joined by copying their records in parallel.\n' )
+		file_names, values = self.create_chunks()
+		self.assertIsNotNone( ec.read_netcdf_record_layout( file_names ) )
+		output_name = os.path.join( self.directory, 'combined.nc' )
+		ec.combine_netcdf_files_parallel( output_name, file_names,
+										  workers = 2 )
+		with netCDF4.Dataset( output_name ) as handle:
+			self.assertEqual( handle.dimensions[ 'time' ].size, 24 )
+			numpy.testing.assert_allclose(
+				handle[ 't2m' ][ : ],
+				numpy.concatenate( [ vv[ 't2m' ] for vv in values ] ),
+				rtol = 1e-6 )
+			numpy.testing.assert_array_equal(
+				handle[ 'longitude' ][ : ], numpy.arange( 4 )*90. )
+		times = []
+		for ffile in file_names:
+			with netCDF4.Dataset( ffile ) as handle:
+				times.append( handle[ 'time' ][ : ] )
+		with netCDF4.Dataset( output_name ) as handle:
+			numpy.testing.assert_array_equal(
+				handle[ 'time' ][ : ], numpy.concatenate( times ) )
+
+	def test_mismatching_headers( self ):
+		print( 'Test, whether chunks with different headers are not joined by copying.\n' )
+		file_names, _ = self.create_chunks()
+		create_chunk( file_names[ 1 ], params = ( 't2m', ) )
+		self.assertIsNone( ec.read_netcdf_record_layout( file_names ) )
+		create_chunk( file_names[ 1 ], file_format = 'NETCDF4' )
+		self.assertIsNone( ec.read_netcdf_record_layout( file_names ) )
+
+	def test_fallback_to_ncrcat( self ):
+		print( 'Test, whether chunks with different headers are joined by a single ncrcat call.\n' )
+		file_names, _ = self.create_chunks()
+		create_chunk( file_names[ 1 ], date = '1980-01-01/to/1980-01-03',
+					  file_format = 'NETCDF3_CLASSIC' )
+		output_name = os.path.join( self.directory, 'combined.nc' )
+		with unittest.mock.patch.object(
+				ec, 'concatenate_netcdf_files',
+				return_value = 0 ) as concatenate_netcdf_files:
+			ec.combine_netcdf_files_parallel( output_name, file_names,
+											  workers = 2 )
+		concatenate_netcdf_files.assert_called_once_with( file_names,
+														  output_name )
+
+	@unittest.skipIf( shutil.which( 'ncrcat' ) is None,
+					  'The NCO toolkit is not installed.' )
+	def test_joining_of_mismatching_headers( self ):
+		print( 'Test, whether chunks with different headers are joined using ncrcat.\n' )
+		file_names, values = self.create_chunks()
+		values[ 1 ] = create_chunk( file_names[ 1 ], date =
+									'1980-01-01/to/1980-01-03',
+									file_format = 'NETCDF3_CLASSIC' )
+		output_name = os.path.join( self.directory, 'combined.nc' )
+		ec.combine_netcdf_files_parallel( output_name, file_names,
+										  workers = 2 )
+		with netCDF4.Dataset( output_name ) as handle:
+			numpy.testing.assert_allclose(
+				handle[ 'sst' ][ : ],
+				numpy.concatenate( [ vv[ 'sst' ] for vv in values ] ),
+				rtol = 1e-6 )
+		self.assertEqual( sorted( os.listdir( self.directory ) ),
+						  sorted( [ os.path.basename( ff ) for ff in
+									file_names ] + [ 'combined.nc' ] ) )
+
+class StubServer( object ):
+	'''Mimics :class:`ecmwfapi.ECMWFDataServer` by writing synthetic
+	chunks.'''
+	def __init__( self ):
+		self.requests = []
+
+	def retrieve( self, options ):
+		self.requests.append( options )
+		create_chunk( options[ 'target' ], date = options[ 'date' ] )
+
+class CountingServer( object ):
+	'''Stub client keeping track of its concurrent requests.'''
+	def __init__( self, error = None ):
+		self.error = error
+		self.active = 0
+		self.max_active = 0
+		self.requests = []
+		self.lock = threading.Lock()
+
+	def retrieve( self, options ):
+		with self.lock:
+			self.active += 1
+			self.max_active = max( self.max_active, self.active )
+			self.requests.append( options[ 'target' ] )
+		time.sleep( 0.02 )
+		with self.lock:
+			self.active -= 1
+		if self.error is not None:
+			raise self.error
+
+class TestServerPool( unittest.TestCase ):
+
+	def test_load_balancing( self ):
+		print( 'Test, whether requests are spread among several accounts.\n' )
+		servers = [ CountingServer(), CountingServer() ]
+		pool = ec.ECMWFServerPool( servers = servers, max_active = 2 )
+		self.assertEqual( pool.capacity, 4 )
+		options_list = [ { 'target' : str( ll ) } for ll in range( 16 ) ]
+		ec.download_queries( pool, options_list )
+		self.assertEqual( sorted( servers[ 0 ].requests +
+								  servers[ 1 ].requests, key = int ),
+						  [ str( ll ) for ll in range( 16 ) ] )
+		for sserver in servers:
+			self.assertEqual( sserver.max_active, 2 )
+			self.assertGreater( len( sserver.requests ), 4 )
+
+	def test_failover( self ):
+		print( 'Test, whether requests are submitted to other accounts in case of errors.\n' )
+		servers = [ CountingServer( error = ConnectionError(
+			'Connection refused.' ) ), CountingServer() ]
+		pool = ec.ECMWFServerPool( servers = servers, max_active = 1,
+								   max_failures = 2 )
+		ec.download_queries( pool, [ { 'target' : str( ll ) }
+									 for ll in range( 6 ) ] )
+		self.assertEqual( len( servers[ 0 ].requests ), 2 )
+		self.assertEqual( len( servers[ 1 ].requests ), 6 )
+		self.assertEqual( pool.capacity, 1 )
+		with self.assertRaises( RuntimeError ):
+			ec.ECMWFServerPool( servers = [ CountingServer(
+				error = RuntimeError( 'Account suspended.' ) ) ] ).retrieve(
+					{ 'target' : '0' } )
+		with self.assertRaises( ValueError ):
+			ec.ECMWFServerPool()
+
+	def test_request_errors( self ):
+		print( 'Test, whether errors specific to a request do not disable any account.\n' )
+		servers = [ CountingServer( error = RuntimeError(
+			'MARS - ERROR: Invalid value "xyz" for param.' ) ),
+					CountingServer() ]
+		pool = ec.ECMWFServerPool( servers = servers, max_active = 1,
+								   max_failures = 1 )
+		for ll in range( 3 ):
+			with self.assertRaises( RuntimeError ):
+				pool.retrieve( { 'target' : str( ll ) } )
+		self.assertEqual( len( servers[ 0 ].requests ), 3 )
+		self.assertEqual( servers[ 1 ].requests, [] )
+		self.assertEqual( pool.capacity, 2 )
+		self.assertTrue( pool.is_account_error( RuntimeError(
+			'ecmwf.API error 1: User has too many active requests' ) ) )
+		self.assertTrue( pool.is_account_error( TimeoutError() ) )
+		self.assertFalse( pool.is_account_error( KeyError( 'param' ) ) )
+
+class TestBackends( TemporaryDirectoryTestCase ):
+
+	def test_lazy_imports( self ):
+		print( 'Test, whether the heavy dependencies are not imported with the package.\n' )
+		output = subprocess.check_output( [
+			sys.executable, '-c', 'import sys; '
+			'import ecmwf_retrieve.ecmwf_retrieve as ec; '
+			'ec.split_query_into_list_of_queries( '
+			'ec.erainterim_default_options() ); '
+			'ec.get_backend( "ecmwfapi" ); '
+			'print( [ mm for mm in ( "numpy", "netCDF4", "ecmwfapi" ) '
+			'if mm in sys.modules ] )' ],
+			cwd = self.working_directory )
+		self.assertEqual( output.decode().strip(), '[]' )
+
+	def test_local_replay( self ):
+		print( 'Test, whether requests are replayed from a local directory.\n' )
+		source = StubServer()
+		storage = os.path.join( self.directory, 'storage' )
+		options = { 'date' : '1979-01-01/to/1979-01-02', 'param' : '2t',
+					'target' : 'first.nc' }
+		ec.get_backend( 'local', directory = storage,
+						source = source ).retrieve( options )
+		backend = ec.LocalDirectoryBackend( storage )
+		backend.retrieve( dict( options, target = 'second.nc' ) )
+		self.assertEqual( len( source.requests ), 1 )
+		with open( 'first.nc', 'rb' ) as first, \
+			 open( 'second.nc', 'rb' ) as second:
+			self.assertEqual( first.read(), second.read() )
+		with self.assertRaises( IOError ):
+			backend.retrieve( dict( options, param = 'sst' ) )
+		with self.assertRaises( ValueError ):
+			ec.get_backend( 'ftp' )
+
+	def test_abstract_interface( self ):
+		print( 'Test, whether backends without a retrieve method can not be created.\n' )
+		class IncompleteBackend( ec.RetrievalBackend ):
+			pass
+		with self.assertRaises( TypeError ):
+			IncompleteBackend()
+
+	def test_offline_retrieve( self ):
+		print( 'Test, whether a whole request can be retrieved offline.\n' )
+		ec.retrieve( options = { 'date' : '1979-12-30/to/1980-01-02',
+								 'target' : 'offline.nc' },
+					 backend = StubServer(), workers = 2 )
+		self.assertEqual( os.listdir( self.directory ), [ 'offline.nc' ] )
+		with netCDF4.Dataset( 'offline.nc' ) as handle:
+			self.assertEqual( handle.dimensions[ 'time' ].size, 16 )
+
+class PendingServer( StubServer ):
+	'''Stub client keeping track of the number of chunks present in
+	the session directory.'''
+	def __init__( self ):
+		StubServer.__init__( self )
+		self.max_pending = 0
+
+	def retrieve( self, options ):
+		StubServer.retrieve( self, options )
+		self.max_pending = max( self.max_pending, len( os.listdir(
+			os.path.dirname( options[ 'target' ] ) ) ) )
+
+class TestDiskBudget( TemporaryDirectoryTestCase ):
+
+	def setUp( self ):
+		TemporaryDirectoryTestCase.setUp( self )
+		self.options = { 'date' : '1979-12-30/to/1982-01-02',
+						 'grid' : '90/90', 'target' : 'budget.nc' }
+
+	def test_estimate_of_chunk_size( self ):
+		print( 'Test, whether the size of a chunk is estimated properly.\n' )
+		self.assertEqual(
+			ec.estimate_chunk_size( dict(
+				default_era, date = '1979-01-01/to/1979-12-31' ) ),
+			365*4*2*480*241*2 + ( 480 + 241 )*8 + 2**14 )
+		self.assertEqual(
+			ec.estimate_chunk_size( dict(
+				default_era, date = '1979-01-01/to/1979-01-01',
+				area = '60/-10/50/2', grid = '1/1' ) ),
+			4*2*13*11*2 + ( 13 + 11 )*8 + 2**14 )
+		self.assertEqual(
+			ec.estimate_chunk_size( dict(
+				default_era, date = '1979-01-01/to/1979-01-01',
+				area = [ 60, -10, 50, 2 ], grid = [ 1, 1 ] ) ),
+			4*2*13*11*2 + ( 13 + 11 )*8 + 2**14 )
+
+	def test_estimate_of_ranges( self ):
+		print( 'Test, whether ranges in the MARS syntax are expanded when estimating the size of a chunk.\n' )
+		options = dict( default_era, date = '1979-01-01/to/1979-01-01' )
+		size = ec.estimate_chunk_size( dict( options,
+											 time = '00/06/12/18' ) )
+		for ttime in [ '00/to/18/by/6', '00:00/to/18:00/by/6',
+					   '0/6/to/18/by/6' ]:
+			self.assertEqual( ec.estimate_chunk_size(
+				dict( options, time = ttime ) ), size )
+		self.assertEqual(
+			ec.estimate_chunk_size( dict( options, number = '1/to/50' ) ),
+			50*ec.estimate_chunk_size( dict( options, number = '1' ) ) -
+			49*( ( 480 + 241 )*8 + 2**14 ) )
+		self.assertEqual(
+			ec.estimate_chunk_size( dict( options, step = '0/3/to/12/by/3',
+										  time = '00/12' ) ),
+			ec.estimate_chunk_size( dict( options, step = '0/3/6/9/12',
+										  time = '00/12' ) ) )
+
+	def test_streaming_within_budget( self ):
+		print( 'Test, whether the chunks are appended one by one within the disk budget.\n' )
+		chunk_sizes = [ ec.estimate_chunk_size( oo ) for oo in
+						ec.split_query_into_list_of_queries(
+							dict( default_era, **self.options ) ) ]
+		server = PendingServer()
+		ec.retrieve( options = self.options, backend = server,
+					 disk_budget = sum( chunk_sizes ) + max( chunk_sizes ) )
+		self.assertEqual( len( server.requests ), 4 )
+		self.assertEqual( server.max_pending, 1 )
+		self.assertEqual( os.listdir(), [ 'budget.nc' ] )
+		with netCDF4.Dataset( 'budget.nc' ) as handle:
+			self.assertEqual( handle.dimensions[ 'time' ].size,
+							  ( 2 + 365 + 366 + 2 )*4 )
+			self.assertTrue( numpy.all( numpy.diff(
+				handle[ 'time' ][ : ] ) == 6 ) )
+
+	def test_separate_scratch_file_system( self ):
+		print( 'Test, whether the free space of a scratch directory on another file system is checked.\n' )
+		os.mkdir( 'scratch' )
+		chunk_sizes = [ ec.estimate_chunk_size( oo ) for oo in
+						ec.split_query_into_list_of_queries(
+							dict( default_era, **self.options ) ) ]
+		free = { os.path.abspath( '.' ) : 10**9,
+				 os.path.abspath( 'scratch' ) : max( chunk_sizes ) - 1 }
+		server = StubServer()
+		with unittest.mock.patch.object(
+				ec, '_free_space',
+				lambda path : free[ os.path.abspath( path ) ] ), \
+			 unittest.mock.patch.object( ec, '_same_device',
+										 return_value = False ):
+			with self.assertRaises( IOError ):
+				ec.retrieve( options = self.options, backend = server,
+							 disk_budget = 10**9, scratch_dir = 'scratch' )
+			self.assertEqual( server.requests, [] )
+			free[ os.path.abspath( 'scratch' ) ] = 2*max( chunk_sizes )
+			ec.retrieve( options = self.options, backend = server,
+						 disk_budget = 10**9, scratch_dir = 'scratch' )
+		self.assertEqual( len( server.requests ), 4 )
+
+	def test_insufficient_budget( self ):
+		print( 'Test, whether a too small disk budget is detected before downloading.\n' )
+		server = StubServer()
+		with self.assertRaises( IOError ):
+			ec.retrieve( options = self.options, backend = server,
+						 disk_budget = 10**4 )
+		self.assertEqual( server.requests, [] )
+
+class TestSessionDirectories( TemporaryDirectoryTestCase ):
+
+	def setUp( self ):
+		TemporaryDirectoryTestCase.setUp( self )
+		self.options = { 'date' : '1979-12-30/to/1980-01-02',
+						 'grid' : '90/90' }
+
+	def test_scratch_directory( self ):
+		print( 'Test, whether the chunks are downloaded into a session directory within the scratch directory.\n' )
+		os.mkdir( 'scratch' )
+		## Unrelated files must not be picked up.
+		create_chunk( 'unrelated_000_.nc' )
+		server = StubServer()
+		ec.retrieve( options = dict( self.options, target = 'output.nc' ),
+					 backend = server, workers = 2,
+					 scratch_dir = 'scratch' )
+		for rrequest in server.requests:
+			self.assertEqual( os.path.dirname( os.path.dirname(
+				os.path.abspath( rrequest[ 'target' ] ) ) ),
+							  os.path.abspath( 'scratch' ) )
+		self.assertEqual( sorted( os.listdir() ),
+						  [ 'output.nc', 'scratch', 'unrelated_000_.nc' ] )
+		self.assertEqual( os.listdir( 'scratch' ), [] )
+		with netCDF4.Dataset( 'output.nc' ) as handle:
+			self.assertEqual( handle.dimensions[ 'time' ].size, 16 )
+
+	def test_concurrent_sessions( self ):
+		print( 'Test, whether several retrievals can run in the same directory at the same time.\n' )
+		## Each session runs in a process of its own and replays its
+		## chunks from a local directory.
+		params = [ '2t', 'sst', 'tp' ]
+		for pparam in params:
+			ec.retrieve( options = dict( self.options, param = pparam,
+										 target = 'storage.nc' ),
+						 backend = ec.LocalDirectoryBackend(
+							 'storage', source = StubServer() ),
+						 workers = 2, verify = False )
+		os.remove( 'storage.nc' )
+		environment = dict( os.environ, PYTHONPATH = os.path.dirname(
+			os.path.dirname( os.path.abspath( ec.__file__ ) ) ) )
+		processes = [ subprocess.Popen( [
+			sys.executable, '-c',
+			'import ecmwf_retrieve.ecmwf_retrieve as ec; '
+			'ec.retrieve( options = ' + repr( dict(
+				self.options, target = 'output.nc', param = pparam ) ) +
+			', backend = ec.LocalDirectoryBackend( "storage" ), '
+			'workers = 2, verify = False )' ],
+									  env = environment,
+									  stdout = subprocess.DEVNULL )
+					  for pparam in params ]
+		for pprocess in processes:
+			self.assertEqual( pprocess.wait(), 0 )
+		self.assertEqual( sorted( os.listdir() ),
+						  [ 'output.nc', 'storage' ] )
+		with netCDF4.Dataset( 'output.nc' ) as handle:
+			self.assertEqual( handle.dimensions[ 'time' ].size, 16 )
+
+	def test_permissions_of_output( self ):
+		print( 'Test, whether the output gets the usual permissions instead of the ones of a temporary file.\n' )
+		umask = os.umask( 0o022 )
+		try:
+			ec.retrieve( options = dict( self.options, target = 'output.nc' ),
+						 backend = StubServer(), workers = 2 )
+		finally:
+			os.umask( umask )
+		self.assertEqual( os.stat( 'output.nc' ).st_mode & 0o777, 0o644 )
+
+	def test_failed_session( self ):
+		print( 'Test, whether a failed retrieval reports its session directory.\n' )
+		with self.assertRaises( IOError ):
+			ec.retrieve( options = dict( self.options, target = 'output.nc',
+										 param = 'tp' ),
+						 backend = StubServer(), retries = 0 )
+		session_dirs = os.listdir()
+		self.assertEqual( len( session_dirs ), 1 )
+		self.assertTrue( session_dirs[ 0 ].startswith( '.output.nc.' ) )
+		self.assertEqual( len( os.listdir( session_dirs[ 0 ] ) ), 2 )
+		shutil.rmtree( session_dirs[ 0 ] )
+		## Without any downloaded chunks nothing is left behind.
+		with self.assertRaises( IOError ):
+			ec.retrieve( options = dict( self.options, target = 'output.nc' ),
+						 backend = ec.LocalDirectoryBackend( 'missing' ) )
+		self.assertEqual( os.listdir(), [] )
+
+	def test_failed_combination( self ):
+		print( 'Test, whether no partial output is left behind in case of an error.\n' )
+		files = [ 'invalid_000_.nc', 'invalid_001_.nc' ]
+		for ffile in files:
+			with open( ffile, 'wb' ) as handle:
+				handle.write( b'CDF' )
+		with self.assertRaises( Exception ):
+			ec.combine_netcdf_files( 'output.nc', delete = False,
+									 files = files, workers = 2 )
+		self.assertEqual( sorted( os.listdir() ), files )
+
+def centennial_mean( data, times, attributes ):
+	'''Custom reducer aggregating over whole centuries.'''
+	century = times[ 0 : 1 ].astype( 'datetime64[Y]' )
+	## Years are counted from 1970 on.
+	century = century - ( century.astype( numpy.int64 ) + 70 ) % 100
+	return data.mean( axis = 0, keepdims = True ), \
+		century.astype( times.dtype ), attributes
+
+class TestReduction( TemporaryDirectoryTestCase ):
+
+	def test_aggregation( self ):
+		print( 'Test, whether the predefined reducers aggregate the time axis properly.\n' )
+		times = numpy.array( [ '1979-01-31T00', '1979-01-31T12',
+							   '1979-02-01T00', '1979-02-01T12',
+							   '1979-02-02T00' ], dtype = 'datetime64[s]' )
+		data = numpy.array( [ 1., 3., numpy.nan, 4., 2. ] )
+		result, result_times, attributes = ec.daily_mean(
+			data, times, { 'units' : 'K' } )
+		numpy.testing.assert_allclose( result, [ 2., 4., 2. ] )
+		self.assertEqual( list( result_times ), list( numpy.array(
+			[ '1979-01-31', '1979-02-01', '1979-02-02' ],
+			dtype = 'datetime64[s]' ) ) )
+		self.assertEqual( attributes, {
+			'units' : 'K', 'cell_methods' : 'time: mean (interval: 1 day)' } )
+		result, result_times, _ = ec.monthly_max( data, times, {} )
+		numpy.testing.assert_allclose( result, [ 3., 4. ] )
+		result, _, attributes = ec.kelvin_to_celsius( data, times, {} )
+		numpy.testing.assert_allclose( result[ 0 ], -272.15 )
+		self.assertEqual( attributes[ 'units' ], 'degC' )
+		## Weeks straddle the month boundaries.
+		for pperiod in [ 'W', 'Y' ]:
+			with self.assertRaises( ValueError ):
+				ec.aggregate_time( data, times, {}, period = pperiod )
+
+	def test_reduction_of_chunk( self ):
+		print( 'Test, whether a chunk is reduced into a small NetCDF file.\n' )
+		values = create_chunk( 'chunk.nc', date = '1979-01-30/to/1979-02-02' )
+		ec.reduce_netcdf_file( 'chunk.nc', 'reduced.nc', {
+			'2t' : [ ec.kelvin_to_celsius, ec.daily_mean ],
+			'sst' : ec.daily_max } )
+		with netCDF4.Dataset( 'reduced.nc' ) as handle:
+			self.assertEqual( handle.data_model, 'NETCDF3_64BIT_OFFSET' )
+			self.assertEqual( sorted( handle.variables.keys() ),
+							  [ 'latitude', 'longitude', 'sst', 't2m',
+								'time' ] )
+			self.assertEqual( handle[ 't2m' ].units, 'degC' )
+			numpy.testing.assert_allclose(
+				handle[ 't2m' ][ : ],
+				values[ 't2m' ].reshape( 4, 4, 3, 4 ).mean( axis = 1 ) -
+				273.15, rtol = 1e-5 )
+			numpy.testing.assert_allclose(
+				handle[ 'sst' ][ : ],
+				values[ 'sst' ].reshape( 4, 4, 3, 4 ).max( axis = 1 ),
+				rtol = 1e-6 )
+			self.assertEqual( list( numpy.diff( handle[ 'time' ][ : ] ) ),
+							  [ 24 ]*3 )
+		with self.assertRaises( ValueError ):
+			ec.reduce_netcdf_file( 'chunk.nc', 'reduced.nc', {
+				'2t' : ec.daily_mean, 'sst' : ec.monthly_mean } )
+		with self.assertRaises( ValueError ):
+			ec.reduce_netcdf_file( 'chunk.nc', 'reduced.nc', {
+				'tp' : ec.daily_sum } )
+		## Aggregations over periods longer than a month are rejected.
+		with self.assertRaises( ValueError ):
+			ec.reduce_netcdf_file( 'chunk.nc', 'reduced.nc', {
+				'2t' : centennial_mean } )
+		self.assertFalse( os.path.isfile( 'reduced.nc' ) )
+
+	def test_retrieve_with_reducers( self ):
+		print( 'Test, whether the chunks are reduced during the retrieval.\n' )
+		for bbudget in [ None, 10**6 ]:
+			ec.retrieve( options = { 'date' : '1979-12-30/to/1981-01-02',
+									 'grid' : '90/90',
+									 'target' : 'reduced.nc' },
+						 backend = StubServer(), workers = 2,
+						 disk_budget = bbudget,
+						 reducers = { '2t' : [ ec.kelvin_to_celsius,
+											   ec.daily_mean ] } )
+			self.assertEqual( os.listdir(), [ 'reduced.nc' ] )
+			with netCDF4.Dataset( 'reduced.nc' ) as handle:
+				self.assertEqual( sorted( handle.variables.keys() ),
+								  [ 'latitude', 'longitude', 't2m',
+									'time' ] )
+				self.assertEqual( handle.dimensions[ 'time' ].size,
+								  2 + 366 + 2 )
+				self.assertTrue( numpy.all( numpy.diff(
+					handle[ 'time' ][ : ] ) == 24 ) )
+
+	def test_overlapping_chunks( self ):
+		print( 'Test, whether reducers aggregating over several chunks are detected.\n' )
+		for bbudget in [ None, 10**6 ]:
+			with self.assertRaises( ValueError ):
+				ec.retrieve( options = { 'date' : '1979-12-30/to/1980-01-02',
+										 'grid' : '90/90',
+										 'target' : 'reduced.nc' },
+							 backend = StubServer(), workers = 2,
+							 disk_budget = bbudget,
+							 reducers = { '2t' : centennial_mean } )
+			self.assertFalse( os.path.isfile( 'reduced.nc' ) )
+
+class TestVerification( TemporaryDirectoryTestCase ):
+
+	def setUp( self ):
+		TemporaryDirectoryTestCase.setUp( self )
+		self.file_name = os.path.join( self.directory, 'chunk.nc' )
+		self.options = { 'param' : '2t/sst', 'grid' : '0.75/0.75',
+						 'date' : '1979-01-01/to/1979-01-02',
+						 'target' : self.file_name }
+		create_chunk( self.file_name )
+
+	def test_verification_of_single_chunks( self ):
+		print( 'Test, whether invalid chunks are detected.\n' )
+		self.assertIsNone( ec.verify_netcdf_file( self.file_name,
+												  self.options ) )
+		self.assertIsNotNone( ec.verify_netcdf_file(
+			self.file_name, dict( self.options, param = '2t/tp' ) ) )
+		self.assertIsNotNone( ec.verify_netcdf_file(
+			self.file_name, dict( self.options,
+								  date = '1979-01-02/to/1979-01-03' ) ) )
+		self.assertIsNone( ec.verify_netcdf_file(
+			self.file_name, dict( self.options, param = '167.128' ) ) )
+		self.assertIsNotNone( ec.verify_netcdf_file(
+			self.file_name, self.options, checksum = '00' ) )
+		with open( self.file_name, 'r+b' ) as handle:
+			handle.truncate( os.path.getsize( self.file_name ) - 10 )
+		self.assertIsNotNone( ec.verify_netcdf_file( self.file_name ) )
+		with open( self.file_name, 'wb' ) as handle:
+			handle.write( b'<html>Service unavailable</html>' )
+		self.assertIsNotNone( ec.verify_netcdf_file( self.file_name ) )
+		self.assertIsNotNone( ec.verify_netcdf_file(
+			os.path.join( self.directory, 'missing.nc' ) ) )
+
+	def test_caching_of_results( self ):
+		print( 'Test, whether the verification results are cached by size and modification time.\n' )
+		cache_file = os.path.join( self.directory, 'cache.json' )
+		self.assertEqual( ec.verify_netcdf_files(
+			[ self.file_name ], [ self.options ], workers = 2,
+			cache_file = cache_file ), { self.file_name : None } )
+		self.assertTrue( os.path.isfile( cache_file ) )
+		## Corrupt the file without altering its size or modification
+		## time.
+		status = os.stat( self.file_name )
+		with open( self.file_name, 'r+b' ) as handle:
+			handle.write( b'XXXX' )
+		os.utime( self.file_name, ns = ( status.st_atime_ns,
+										 status.st_mtime_ns ) )
+		self.assertEqual( ec.verify_netcdf_files(
+			[ self.file_name ], [ self.options ],
+			cache_file = cache_file ), { self.file_name : None } )
+		self.assertIsNotNone( ec.verify_netcdf_files(
+			[ self.file_name ], [ self.options ] )[ self.file_name ] )
+		## Entries of deleted files are pruned.
+		os.remove( self.file_name )
+		ec.verify_netcdf_files( [], [], cache_file = cache_file )
+		with open( cache_file, 'r' ) as handle:
+			self.assertEqual( handle.read(), '{}' )
+
+	def test_redownload_of_invalid_chunks( self ):
+		print( 'Test, whether invalid chunks are downloaded again.\n' )
+		options_list = [ self.options,
+						 dict( self.options, date = '1980-01-01/to/1980-01-01',
+							   target = os.path.join( self.directory,
+													  'chunk_2.nc' ) ) ]
+		with open( options_list[ 1 ][ 'target' ], 'wb' ) as handle:
+			handle.write( b'CDF' )
+		server = StubServer()
+		self.assertEqual( ec.redownload_invalid_queries(
+			server, options_list ), 0 )
+		self.assertEqual( server.requests, [ options_list[ 1 ] ] )
+		with self.assertRaises( IOError ):
+			ec.redownload_invalid_queries(
+				server, [ dict( self.options, param = 'tp' ) ], retries = 1 )
+		self.assertEqual( len( server.requests ), 2 )
+		## Chunks the header parser chokes on are downloaded again
+		## as well.
+		with open( options_list[ 1 ][ 'target' ], 'rb' ) as handle:
+			content = bytearray( handle.read() )
+		position = content.index( b'longitude', content.index(
+			b'longitude' ) + 9 ) + 12 + 4
+		content[ position : position + 4 ] = b'\x00\x00\x00\x09'
+		with open( options_list[ 1 ][ 'target' ], 'wb' ) as handle:
+			handle.write( content )
+		self.assertIsNotNone( ec.verify_netcdf_files(
+			[ options_list[ 1 ][ 'target' ] ], [ options_list[ 1 ] ],
+			workers = 2 )[ options_list[ 1 ][ 'target' ] ] )
+		self.assertEqual( ec.redownload_invalid_queries(
+			server, options_list, workers = 2 ), 0 )
+		self.assertEqual( server.requests[ -1 ], options_list[ 1 ] )
+
+	def test_checksums_in_retrieve( self ):
+		print( 'Test, whether retrieve passes the checksums on to the verification.\n' )
+		server = StubServer()
+		with self.assertRaises( IOError ):
+			ec.retrieve( options = {
+				'date' : '1979-12-31/to/1980-01-01', 'grid' : '90/90',
+				'target' : os.path.join( self.directory, 'output.nc' ) },
+						 backend = server, retries = 1, workers = 2,
+						 checksums = { 'output_000_.nc' : '00' } )
+		## Both chunks and one retry of the first one.
+		self.assertEqual( [ os.path.basename( rr[ 'target' ] )
+							for rr in server.requests ],
+						  [ 'output_000_.nc', 'output_001_.nc',
+							'output_000_.nc' ] )
+
 if __name__ == '__main__':
 	unittest.main()